@@ -1,38 +1,115 @@
+import sys
 import time
 import asyncio
 import logging
-from collections import deque
 from typing import Optional
 
 from aiogram import BaseMiddleware
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery, Message
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, Message
 
-from models import User
 from config import Config
+from keyboards.callback_data import pack, CheckSub
+from keyboards.inline_keyboards import subscription_keyboard
+from services import tasks
+from services.rate_limiter import InMemoryRateLimiter, SharedRateLimiter, JUST_BLOCKED, ALLOWED
+from services.shared_state import shared_store
+from services.subscription_cache import subscription_cache
+from services.user_buffer import user_buffer
 
 LOG = logging.getLogger(__name__)
 
+CHECK_SUB_DATA = pack(CheckSub())
+
+SUB_PROMPT_TEXT = (
+    "📢 <b>Botdan foydalanish uchun</b> bizning rasmiy kanalga obuna bo‘ling!\n\n"
+    "👉 Obuna bo‘lgach, pastdagi <b>“Obunani tekshirish”</b> tugmasini bosing.\n\n"
+    "❤️ Sizning qo‘llab-quvvatlashingiz biz uchun muhim!"
+)
+
 
 class SubscriptionMiddleware(BaseMiddleware):
-    def __init__(self):
+    def __init__(self, rate_limiter=None):
         super().__init__()
-        # user_id -> deque of monotonic timestamps (requests within sliding window)
-        self._req_times: dict[int, deque] = {}
-        # user_id -> blocked_until monotonic time (float) if blocked, else absent
-        self._blocked_until: dict[int, float] = {}
         # avoid spamming the "please subscribe" prompt: user_id -> last prompt monotonic time
+        # (kept in prompt order, oldest first, so expiry only looks at the front)
         self._last_sub_prompt: dict[int, float] = {}
-
-        self._lock = asyncio.Lock()
+        self._sweeper: Optional[asyncio.Task] = None
 
         # config
-        self._window_secs = 20.0         # sliding window length
+        self._window_secs = 20.0         # rate-limit window length
         self._limit_count = 10           # if >= this many in window -> block
         self._block_secs = 60.0          # block duration when exceeded
         self._sub_prompt_cooldown = 30.0 # don't re-send sub prompt more often than this
         self._auto_delete_secs = 3.0     # ephemeral text messages auto-delete
 
+        self._sweep_secs = Config.STATE_SWEEP_SECS
+        self._max_users = Config.STATE_MAX_USERS
+
+        # per-user state, no global lock; shared between workers when a shared store is configured
+        if rate_limiter is None and shared_store is not None:
+            rate_limiter = SharedRateLimiter(
+                shared_store,
+                limit_count=self._limit_count,
+                window_secs=self._window_secs,
+                block_secs=self._block_secs,
+            )
+        self._rate_limiter = rate_limiter or InMemoryRateLimiter(
+            limit_count=self._limit_count,
+            window_secs=self._window_secs,
+            block_secs=self._block_secs,
+            max_users=self._max_users,
+        )
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Evict expired per-user entries; returns how many were removed."""
+        if now is None:
+            now = time.monotonic()
+        removed = 0
+        prompts = self._last_sub_prompt
+        cutoff = now - self._sub_prompt_cooldown
+        while prompts:
+            uid = next(iter(prompts))
+            if prompts[uid] >= cutoff:
+                break
+            del prompts[uid]
+            removed += 1
+        if hasattr(self._rate_limiter, "sweep"):
+            removed += self._rate_limiter.sweep()
+        return removed
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self._sweep_secs)
+            removed = self.sweep()
+            if shared_store is not None:
+                removed += await shared_store.purge_expired()
+            LOG.debug("Swept %d expired middleware entries: %s", removed, self.stats())
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    def stats(self) -> dict:
+        prompts = len(self._last_sub_prompt)
+        stats = {
+            "sub_prompts": prompts,
+            # key int + float value
+            "sub_prompts_approx_bytes": sys.getsizeof(self._last_sub_prompt) + prompts * (sys.getsizeof(0) + sys.getsizeof(0.0)),
+            "subscription_cache": subscription_cache.stats(),
+        }
+        if hasattr(self._rate_limiter, "stats"):
+            stats["rate_limiter"] = self._rate_limiter.stats()
+        return stats
+
     async def _send_message_and_delete(self, bot, chat_id: int, text: str, reply_to: Optional[int] = None):
         try:
             if reply_to:
@@ -50,7 +127,27 @@ class SubscriptionMiddleware(BaseMiddleware):
             except Exception:
                 pass
 
-        asyncio.create_task(_del_later(sent))
+        # tracked so shutdown waits for the delete instead of dropping it
+        tasks.spawn(_del_later(sent))
+
+    async def _notify_blocked(self, bot, event, user_id: int, kind: str, msg_id: Optional[int], cq, msg: str):
+        try:
+            # prefer callback answer
+            if kind == "callback":
+                try:
+                    if cq is not None:
+                        await cq.answer(text=msg, show_alert=True)
+                        return
+                    cbid = getattr(event, "id", None) or getattr(getattr(event, "callback_query", None), "id", None)
+                    if cbid:
+                        await bot.answer_callback_query(callback_query_id=cbid, text=msg, show_alert=True)
+                except Exception as e:
+                    LOG.debug("callback answer failed while blocked: %s", e)
+                    await self._send_message_and_delete(bot, user_id, msg)
+            else:
+                await self._send_message_and_delete(bot, user_id, msg, reply_to=msg_id)
+        except Exception as e:
+            LOG.debug("Failed to notify blocked user %s: %s", user_id, e)
 
     def _extract_user_and_type(self, event):
         """
@@ -86,110 +183,38 @@ class SubscriptionMiddleware(BaseMiddleware):
 
         now = time.monotonic()
 
-        # --- Rate limiting & blocking logic (atomic) ---
-        async with self._lock:
-            # check if currently blocked
-            blocked_until = self._blocked_until.get(user_id)
-            if blocked_until and now < blocked_until:
-                LOG.debug("User %s is currently blocked until %s (now=%s)", user_id, blocked_until, now)
-                # notify user about block (do not call handler)
-                try:
-                    remaining = int(blocked_until - now)
-                    msg = f"Siz juda koʻp soʻrov yubordingiz. {remaining} soniyaga bloklandi. Iltimos, keyinroq urinib koʻring."
-                    # prefer callback answer
-                    if kind == "callback":
-                        try:
-                            if cq is not None:
-                                await cq.answer(text=msg, show_alert=True)
-                                return
-                            else:
-                                cbid = getattr(event, "id", None) or getattr(getattr(event, "callback_query", None), "id", None)
-                                if cbid:
-                                    await bot.answer_callback_query(callback_query_id=cbid, text=msg, show_alert=True)
-                                    return
-                        except Exception as e:
-                            LOG.debug("callback answer failed while blocked: %s", e)
-                            await self._send_message_and_delete(bot, user_id, msg)
-                            return
-                    else:
-                        await self._send_message_and_delete(bot, user_id, msg, reply_to=msg_id)
-                        return
-                except Exception as e:
-                    LOG.debug("Failed to notify blocked user %s: %s", user_id, e)
-                    return
-
-            # not currently blocked -> update request timestamps
-            dq = self._req_times.get(user_id)
-            if dq is None:
-                dq = deque()
-                self._req_times[user_id] = dq
-
-            # push current timestamp and pop older than window
-            dq.append(now)
-            cutoff = now - self._window_secs
-            while dq and dq[0] < cutoff:
-                dq.popleft()
-
-            # if limit reached -> block
-            if len(dq) >= self._limit_count:
-                self._blocked_until[user_id] = now + self._block_secs
-                # clear request history to avoid repeated triggers
-                dq.clear()
+        # --- Rate limiting & blocking: decide first, notify afterwards ---
+        decision = await self._rate_limiter.hit(user_id)
+        if decision.status != ALLOWED:
+            if decision.status == JUST_BLOCKED:
                 LOG.info("User %s exceeded %d requests in %ds: blocking for %ds", user_id, self._limit_count, int(self._window_secs), int(self._block_secs))
-                # inform user about the block
-                try:
-                    block_msg = f"Siz {int(self._window_secs)} soniyada {self._limit_count} yoki undan koʻp soʻrov yubordingiz. {int(self._block_secs)} soniyaga bloklanildi."
-                    if kind == "callback":
-                        try:
-                            if cq is not None:
-                                await cq.answer(text=block_msg, show_alert=True)
-                                return
-                            else:
-                                cbid = getattr(event, "id", None) or getattr(getattr(event, "callback_query", None), "id", None)
-                                if cbid:
-                                    await bot.answer_callback_query(callback_query_id=cbid, text=block_msg, show_alert=True)
-                                    return
-                        except Exception as e:
-                            LOG.debug("callback block answer failed: %s", e)
-                            await self._send_message_and_delete(bot, user_id, block_msg)
-                            return
-                    else:
-                        await self._send_message_and_delete(bot, user_id, block_msg, reply_to=msg_id)
-                        return
-                except Exception as e:
-                    LOG.debug("Failed to notify user about new block: %s", e)
-                    return
-
-        # --- End rate-limit/block section ---
+                msg = f"Siz {int(self._window_secs)} soniyada {self._limit_count} yoki undan koʻp soʻrov yubordingiz. {int(self._block_secs)} soniyaga bloklanildi."
+            else:
+                LOG.debug("User %s is currently blocked for %.1fs more", user_id, decision.remaining)
+                msg = f"Siz juda koʻp soʻrov yubordingiz. {int(decision.remaining)} soniyaga bloklandi. Iltimos, keyinroq urinib koʻring."
+            # do not call handler
+            await self._notify_blocked(bot, event, user_id, kind, msg_id, cq, msg)
+            return
 
-        # Record (or create) user in DB (non-critical; ignore failures)
+        # Record user (write-behind: batched upsert in the background, no DB round-trip here)
         user_obj = getattr(event, "from_user", None) or getattr(getattr(event, "message", None), "from_user", None) or getattr(getattr(event, "callback_query", None), "from_user", None)
-        defaults = {
-            "first_name": getattr(user_obj, "first_name", None),
-            "last_name": getattr(user_obj, "last_name", None),
-            "lang": getattr(user_obj, "language_code", "uz")
-        }
-        try:
-            User.get_or_create(telegram_id=user_id, defaults=defaults)
-        except Exception:
-            pass
+        user_buffer.touch(
+            user_id,
+            getattr(user_obj, "first_name", None),
+            getattr(user_obj, "last_name", None),
+            getattr(user_obj, "language_code", None),
+        )
 
         # If no bot or no channel configured, continue
         if not bot or not getattr(Config, "CHANNEL_ID", None):
             return await handler(event, data)
 
-        # Check subscription. If not subscribed, send subscription prompt and DO NOT call handler.
-        try:
-            member = await bot.get_chat_member(chat_id=Config.CHANNEL_ID, user_id=user_id)
-            if member.status in ("creator", "administrator", "member", "restricted"):
-                # subscribed -> continue to handler
-                return await handler(event, data)
-        except TelegramBadRequest:
-            # user is not a member or Telegram returned 400-series error -> treat as not subscribed
-            pass
-        except Exception as e:
-            LOG.debug("Error while checking chat member for user %s: %s", user_id, e)
-            # to be safe, allow handler to proceed on unexpected errors
+        # Check subscription (cached). Pressing "check_sub" always asks Telegram again.
+        force = kind == "callback" and cq is not None and cq.data == CHECK_SUB_DATA
+        is_subscribed = await subscription_cache.is_subscribed(bot, user_id, force=force)
+        if is_subscribed or is_subscribed is None:
+            # subscribed -> continue to handler
+            # (None: unexpected error, to be safe allow handler to proceed)
             return await handler(event, data)
 
         # At this point: user is not subscribed -> send subscription prompt (but respect cooldown)
@@ -199,30 +224,21 @@ class SubscriptionMiddleware(BaseMiddleware):
             LOG.debug("Skipping repeated sub prompt for user %s (cooldown)", user_id)
             return  # do not call handler
 
-        # build keyboard and send message
-        kb_buttons = []
-        chan_username = getattr(Config, "CHANNEL_USERNAME", None)
-        if chan_username:
-            kb_buttons.append(InlineKeyboardButton(text="Kanalga o‘tish", url=f"https://t.me/{chan_username}"))
-        kb_buttons.append(InlineKeyboardButton(text="Obunani tekshirish", callback_data="check_sub"))
-        markup = InlineKeyboardMarkup(inline_keyboard=[[b] for b in kb_buttons])
-
         try:
             await bot.send_message(
                 chat_id=user_id,
-                text=(
-                    "📢 <b>Botdan foydalanish uchun</b> bizning rasmiy kanalga obuna bo‘ling!\n\n"
-                    "👉 Obuna bo‘lgach, pastdagi <b>“Obunani tekshirish”</b> tugmasini bosing.\n\n"
-                    "❤️ Sizning qo‘llab-quvvatlashingiz biz uchun muhim!"
-                ),
+                text=SUB_PROMPT_TEXT,
                 parse_mode="HTML",
-                reply_markup=markup
+                reply_markup=subscription_keyboard()
             )
         except Exception as e:
             LOG.debug("Failed to send subscription prompt to user %s: %s", user_id, e)
 
-        # remember we prompted the user (to avoid spamming)
+        # remember we prompted the user (to avoid spamming); re-insert to keep prompt order
+        self._last_sub_prompt.pop(user_id, None)
         self._last_sub_prompt[user_id] = now
+        if len(self._last_sub_prompt) > self._max_users:
+            del self._last_sub_prompt[next(iter(self._last_sub_prompt))]
 
         # important: DO NOT call handler when user is not subscribed
         return
\ No newline at end of file
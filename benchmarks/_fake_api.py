@@ -0,0 +1,179 @@
+"""
+Local fake Telegram Bot API server for the benchmark scripts. Enforces a
+global and a per-chat message rate and answers 429 with retry_after like
+Telegram does (global_rate=None: no limits), so bots can be driven hard
+without touching the real API. Answers the methods the bot uses with
+minimal valid objects.
+
+Messages sent in each chat are remembered, so edits are checked the way
+Telegram checks them (editMessageText on a photo, editMessageMedia on a text
+message -> 400) and last_message() gives what a user would press next.
+"""
+import json
+import time
+import asyncio
+import datetime
+from collections import deque
+from typing import Optional
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+FAKE_TOKEN = "123456:fake-token-for-benchmarks"
+
+# methods counted against the per-chat limit (lower-case Bot API names) and,
+# for new messages only, against the global one
+_LIMITED = ("send", "edit", "copy", "forward", "delete")
+_GLOBAL = ("send", "copy", "forward")
+
+
+class FakeTelegramAPI:
+    def __init__(self, global_rate: Optional[int] = 30, chat_rate: float = 1.0, chat_burst: int = 3, latency: float = 0.02,
+                 member_status: str = "member"):
+        self._global_rate = global_rate
+        self._chat_rate = chat_rate
+        self._chat_burst = float(chat_burst)
+        self._latency = latency
+        self._member_status = member_status
+        self._recent: deque = deque()  # accepted limited calls in the last second
+        self._chats: dict[int, list] = {}  # chat_id -> [tokens, updated]
+        self._message_id = 0
+        # chats that answer 403 like a user who blocked the bot
+        self.blocked_chats: set[int] = set()
+        self.received: dict[int, int] = {}  # chat_id -> messages delivered
+        self.messages: dict[int, dict[int, dict]] = {}  # chat_id -> message_id -> message still in the chat
+
+        self.calls: dict[str, int] = {}
+        self.too_many = 0
+        self._runner = None
+        self.url = None
+
+    def _limited(self, chat_id, is_global: bool) -> bool:
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 1.0:
+            self._recent.popleft()
+        if is_global and len(self._recent) >= self._global_rate:
+            return True
+        if chat_id is not None:
+            tokens, updated = self._chats.get(chat_id, (self._chat_burst, now))
+            tokens = min(self._chat_burst, tokens + (now - updated) * self._chat_rate)
+            if tokens < 1.0:
+                self._chats[chat_id] = [tokens, now]
+                return True
+            self._chats[chat_id] = [tokens - 1.0, now]
+        if is_global:
+            self._recent.append(now)
+        return False
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        data = await request.post()
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await asyncio.sleep(self._latency)
+
+        chat_id = data.get("chat_id")
+        chat_id = int(chat_id) if chat_id and chat_id.lstrip("-").isdigit() else None
+        if self._global_rate is not None and method.startswith(_LIMITED) and self._limited(chat_id, method.startswith(_GLOBAL)):
+            self.too_many += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1},
+            }, status=429)
+
+        if chat_id in self.blocked_chats:
+            return web.json_response({
+                "ok": False,
+                "error_code": 403,
+                "description": "Forbidden: bot was blocked by the user",
+            }, status=403)
+
+        if method.startswith("send"):
+            self.received[chat_id] = self.received.get(chat_id, 0) + 1
+            result = self._message(chat_id, data)
+            if method == "sendphoto":
+                self._set_photo(result)
+            self.messages.setdefault(chat_id, {})[result["message_id"]] = result
+        elif method.startswith("edit"):
+            message_id = int(data.get("message_id") or 0)
+            existing = self.messages.get(chat_id, {}).get(message_id)
+            if existing is None:
+                # a message this server did not send (synthetic updates): accept anything
+                result = self._message(chat_id, data)
+            else:
+                error = self._edit(method, existing, data)
+                if error:
+                    return web.json_response({"ok": False, "error_code": 400, "description": f"Bad Request: {error}"}, status=400)
+                result = existing
+        elif method == "deletemessage":
+            self.messages.get(chat_id, {}).pop(int(data.get("message_id") or 0), None)
+            result = True
+        elif method == "getchatmember":
+            user_id = int(data.get("user_id", 0))
+            result = {"status": self._member_status, "user": {"id": user_id, "is_bot": False, "first_name": "u"}}
+        elif method == "getme":
+            result = {"id": int(FAKE_TOKEN.split(":")[0]), "is_bot": True, "first_name": "bot", "username": "fake_bot"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def _set_photo(self, message: dict, caption: Optional[str] = None):
+        message["photo"] = [{"file_id": f"photo{self._message_id}", "file_unique_id": f"u{self._message_id}", "width": 1, "height": 1}]
+        message["caption"] = message.pop("text", "") if caption is None else caption
+
+    def _edit(self, method: str, message: dict, data) -> Optional[str]:
+        """Apply an edit to a remembered message; error description if Telegram would refuse it."""
+        is_photo = "photo" in message
+        if method == "editmessagetext":
+            if is_photo:
+                return "there is no text in the message to edit"
+            if data.get("text") == message["text"]:
+                return "message is not modified"
+            message["text"] = data.get("text")
+        elif method == "editmessagecaption":
+            if not is_photo:
+                return "there is no caption in the message to edit"
+            message["caption"] = data.get("caption") or ""
+        elif method == "editmessagemedia":
+            if not is_photo:
+                return "there is no media in the message to edit"
+            self._message_id += 1
+            self._set_photo(message, json.loads(data.get("media") or "{}").get("caption") or "")
+        return None
+
+    def last_message(self, chat_id: int) -> Optional[dict]:
+        """Newest message still in the chat (the one whose buttons a user presses)."""
+        messages = self.messages.get(chat_id)
+        return messages[max(messages)] if messages else None
+
+    def _message(self, chat_id, data) -> dict:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(datetime.datetime.now().timestamp()),
+            "chat": {"id": chat_id or 0, "type": "private"},
+            "text": data.get("text") or data.get("caption") or "",
+        }
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host=host, port=port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def bot(self) -> Bot:
+        """Bot whose requests go to this server."""
+        session = AiohttpSession(api=TelegramAPIServer.from_base(self.url))
+        return Bot(token=FAKE_TOKEN, session=session)
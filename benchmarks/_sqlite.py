@@ -0,0 +1,73 @@
+"""
+SQLite stand-in for the MySQL database, shared by the benchmark scripts.
+Run the scripts from the repository root: python -m benchmarks.<name>
+"""
+import os
+import time
+import random
+import tempfile
+import threading
+
+from peewee import SqliteDatabase
+
+from models import db, ConfidraMudiri, User
+from keyboards.inline_keyboards import FAKULTETLAR
+from services.lifecycle import MODELS
+from services.metrics import record_db_query
+
+
+class CountingSqliteDatabase(SqliteDatabase):
+    """
+    SqliteDatabase that counts executed statements (from any thread) and
+    reports them to services.metrics like the MySQL database does.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._count_lock = threading.Lock()
+        self.queries = 0
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        with self._count_lock:
+            self.queries += 1
+        started = time.perf_counter()
+        try:
+            return super().execute_sql(sql, params, *args, **kwargs)
+        finally:
+            record_db_query(time.perf_counter() - started)
+
+    def reset_count(self):
+        with self._count_lock:
+            self.queries = 0
+
+
+def setup_sqlite(path: str = None) -> CountingSqliteDatabase:
+    """Point models.db at a fresh SQLite file and create the tables."""
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="tisu_bench_", suffix=".db")
+        os.close(fd)
+    sqlite = CountingSqliteDatabase(path, pragmas={"journal_mode": "wal", "busy_timeout": 5000})
+    db.initialize(sqlite)
+    with db.connection_context():
+        db.drop_tables(MODELS, safe=True)
+        db.create_tables(MODELS)
+    return sqlite
+
+
+def seed(candidates_per_faculty: int = 10, voters: int = 5000, seed_value: int = 1) -> list[int]:
+    """Synthetic candidates for every faculty plus `voters` users with random votes."""
+    rnd = random.Random(seed_value)
+    with db.connection_context(), db.atomic():
+        for fid in FAKULTETLAR:
+            ConfidraMudiri.insert_many([
+                {"full_name": f"Nomzod {fid}-{i:02d} Familiyev", "image": "", "facultet_type": fid}
+                for i in range(candidates_per_faculty)
+            ]).execute()
+        candidate_ids = [mid for (mid,) in ConfidraMudiri.select(ConfidraMudiri.id).tuples()]
+        rows = [
+            {"telegram_id": 10_000_000 + i, "first_name": f"user{i}", "confedra_mudiri": rnd.choice(candidate_ids)}
+            for i in range(voters)
+        ]
+        for start in range(0, len(rows), 500):
+            User.insert_many(rows[start:start + 500]).execute()
+    return candidate_ids
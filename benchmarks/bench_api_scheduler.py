@@ -0,0 +1,82 @@
+"""
+Outbound Bot API shaping against the local fake Telegram server.
+
+A bulk send to many chats runs while users keep pressing buttons; reports how
+many 429s Telegram would have returned, how many calls failed and how long
+callback answers took.
+
+    python -m benchmarks.bench_api_scheduler [--chats 200] [--no-scheduler]
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from benchmarks._fake_api import FakeTelegramAPI
+from services.api_scheduler import ApiScheduler, bulk
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--per-chat", type=int, default=3, help="bulk messages per chat")
+    parser.add_argument("--callbacks", type=int, default=100)
+    parser.add_argument("--no-scheduler", action="store_true")
+    args = parser.parse_args()
+
+    api = FakeTelegramAPI()
+    await api.start()
+    bot = api.bot()
+    if not args.no_scheduler:
+        bot.session.middleware(ApiScheduler())
+
+    failed = 0
+    callback_secs = []
+
+    async def send(chat_id: int, n: int):
+        nonlocal failed
+        try:
+            await bot.send_message(chat_id=chat_id, text=f"broadcast {n}")
+        except TelegramRetryAfter:
+            failed += 1
+
+    async def broadcast():
+        with bulk():
+            await asyncio.gather(*(
+                send(10_000 + c, n) for n in range(args.per_chat) for c in range(args.chats)
+            ))
+
+    async def press(i: int):
+        nonlocal failed
+        # button presses trickle in while the broadcast is queued
+        await asyncio.sleep(i * 0.05)
+        started = time.perf_counter()
+        try:
+            await bot.answer_callback_query(callback_query_id=str(i))
+            callback_secs.append(time.perf_counter() - started)
+        except TelegramRetryAfter:
+            failed += 1
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(broadcast(), *(press(i) for i in range(args.callbacks)))
+    finally:
+        await bot.session.close()
+        await api.stop()
+    elapsed = time.perf_counter() - started
+
+    total = args.chats * args.per_chat + args.callbacks
+    callback_secs.sort()
+    p95 = callback_secs[int(len(callback_secs) * 0.95) - 1] if callback_secs else 0.0
+    print(
+        f"{'without' if args.no_scheduler else 'with'} scheduler: {total} calls in {elapsed:.1f}s, "
+        f"{api.too_many} x 429 from the server, {failed} failed; "
+        f"callback answer p50 {statistics.median(callback_secs or [0]) * 1000:.0f}ms "
+        f"p95 {p95 * 1000:.0f}ms"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Broadcast to every seeded user through the local fake Telegram server, with
+an interruption half-way: the first run is stopped, a second broadcaster
+claims the job and resumes from the checkpoint. Checks that every reachable
+user got the message, blocked users were marked, and reports throughput.
+
+    python -m benchmarks.bench_broadcast [--users 3000] [--rate 300]
+"""
+import time
+import asyncio
+import argparse
+
+from benchmarks._fake_api import FakeTelegramAPI
+from benchmarks._sqlite import setup_sqlite, seed
+from models import db, BlockedUser, Broadcast, User
+from services import repository
+from services.api_scheduler import ApiScheduler
+from services.broadcast import Broadcaster
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=3000)
+    parser.add_argument("--blocked", type=float, default=0.05, help="share of users that blocked the bot")
+    parser.add_argument("--rate", type=float, default=300.0, help="global send rate (fake server limit is raised to match)")
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    setup_sqlite()
+    seed(candidates_per_faculty=1, voters=args.users)
+    with db.connection_context():
+        telegram_ids = [tid for (tid,) in User.select(User.telegram_id).tuples()]
+
+    api = FakeTelegramAPI(global_rate=int(args.rate) + 5, latency=0.01)
+    step = max(1, int(1 / args.blocked)) if args.blocked else 0
+    api.blocked_chats = {tid for i, tid in enumerate(telegram_ids) if step and i % step == 0}
+    await api.start()
+    bot = api.bot()
+    bot.session.middleware(ApiScheduler(global_rate=args.rate, global_burst=5))
+
+    started = time.perf_counter()
+    try:
+        first = Broadcaster(batch_size=args.batch, workers=args.workers, lease_secs=0.5)
+        first.set_bot(bot)
+        job_id = await first.create("Ovoz berish ertaga soat 18:00 da tugaydi.")
+        # stop roughly half-way, as a deploy or crash would
+        await asyncio.sleep(args.users / args.rate / 2)
+        await first.stop()
+        job = await repository.get_broadcast(job_id)
+        print(f"interrupted at user id {job.last_user_id}: {job.sent} sent, {job.blocked} blocked")
+
+        second = Broadcaster(batch_size=args.batch, workers=args.workers, lease_secs=0.5)
+        second.set_bot(bot)
+        second.start()
+        while (await repository.get_broadcast(job_id)).status == "running":
+            await asyncio.sleep(0.2)
+        await second.stop()
+    finally:
+        await bot.session.close()
+        await api.stop()
+    elapsed = time.perf_counter() - started
+
+    with db.connection_context():
+        job = Broadcast.get_by_id(job_id)
+        marked = BlockedUser.select().count()
+    reachable = set(telegram_ids) - api.blocked_chats
+    missing = [tid for tid in reachable if not api.received.get(tid)]
+    duplicates = sum(n - 1 for n in api.received.values() if n > 1)
+
+    print(
+        f"{job.status}: {job.sent} sent, {job.blocked} blocked, {job.failed} failed of {job.total} "
+        f"in {elapsed:.1f}s ({(job.sent + job.blocked) / elapsed:.0f} msg/s); "
+        f"{marked} users marked blocked, {len(missing)} reachable users missed, "
+        f"{duplicates} re-sent after the interruption"
+    )
+    if missing or marked != len(api.blocked_chats):
+        raise SystemExit("FAILED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
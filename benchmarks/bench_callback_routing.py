@@ -0,0 +1,123 @@
+"""
+Router dispatch cost per callback: the previous chain of lambda/F filters
+(one per handler, each handler re-splitting call.data) against the single
+route_callback handler with the prefix table. Handlers are no-ops, so the
+numbers are aiogram routing + payload parsing only.
+
+    python -m benchmarks.bench_callback_routing [--updates 50000]
+"""
+import time
+import random
+import asyncio
+import argparse
+import datetime
+
+from aiogram import Bot, Dispatcher, Router, F
+from aiogram.types import CallbackQuery, Chat, Message, Update, User as TgUser
+
+from keyboards import callback_data as cbd
+
+FAKE_TOKEN = "123456:fake-token-for-benchmarks"
+
+# realistic mix of button presses
+PAYLOADS = (
+    ["fakultet:1", "fakultet:2", "fakultet:3"] * 3
+    + [f"mudir:{i}" for i in range(1, 31)]
+    + [f"vote:{i}" for i in range(1, 31)]
+    + ["back_fakultet:1", "back_fakultet:2", "main_menu", "stats", "stats:2", "check_sub"]
+)
+
+
+def _legacy_router(hits: list) -> Router:
+    router = Router()
+
+    def handler_for(name):
+        async def handler(call: CallbackQuery):
+            if ":" in call.data:
+                int(call.data.split(":", 1)[1])
+            hits.append(name)
+        return handler
+
+    router.callback_query(F.data == "check_sub")(handler_for("check_sub"))
+    router.callback_query(lambda c: c.data and c.data.startswith("back_fakultet:"))(handler_for("back"))
+    router.callback_query(lambda c: c.data and c.data.startswith("fakultet:"))(handler_for("fakultet"))
+    router.callback_query(lambda c: c.data and c.data.startswith("mudir:"))(handler_for("mudir"))
+    router.callback_query(lambda c: c.data == "main_menu")(handler_for("main_menu"))
+    router.callback_query(lambda c: c.data and c.data.startswith("vote:"))(handler_for("vote"))
+    router.callback_query(lambda c: c.data and (c.data == "stats" or c.data.startswith("stats:")))(handler_for("stats"))
+    return router
+
+
+def _table_router(hits: list) -> Router:
+    router = Router()
+
+    def handler_for(name):
+        async def handler(call: CallbackQuery, data):
+            hits.append(name)
+        return handler
+
+    routes = {t: handler_for(t.prefix) for t in cbd.TYPES}
+
+    # same shape as handlers.start_handler.route_callback, without metrics
+    @router.callback_query()
+    async def route_callback(call: CallbackQuery):
+        data = cbd.unpack(call.data)
+        if data is None:
+            return
+        await routes[type(data)](call, data)
+
+    return router
+
+
+def _updates(n: int) -> list[Update]:
+    rnd = random.Random(1)
+    user = TgUser(id=42, is_bot=False, first_name="u")
+    message = Message(message_id=1, date=datetime.datetime.now(), chat=Chat(id=42, type="private"), text="x")
+    return [
+        Update(
+            update_id=i,
+            callback_query=CallbackQuery(
+                id=str(i), from_user=user, chat_instance="1", message=message, data=rnd.choice(PAYLOADS)
+            ),
+        )
+        for i in range(n)
+    ]
+
+
+async def _measure(name: str, router: Router, updates: list[Update], hits: list):
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token=FAKE_TOKEN)
+    try:
+        # warm-up (aiogram resolves middlewares/filters lazily)
+        for update in updates[:1000]:
+            await dp.feed_update(bot, update)
+        hits.clear()
+        started = time.perf_counter()
+        for update in updates:
+            await dp.feed_update(bot, update)
+        elapsed = time.perf_counter() - started
+    finally:
+        await bot.session.close()
+    assert len(hits) == len(updates), (name, len(hits))
+    print(f"{name:>14}: {elapsed / len(updates) * 1e6:6.1f} us per callback")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=50000)
+    args = parser.parse_args()
+
+    updates = _updates(args.updates)
+    hits = []
+    await _measure("filter chain", _legacy_router(hits), updates, hits)
+    await _measure("prefix table", _table_router(hits), updates, hits)
+
+    started = time.perf_counter()
+    for update in updates:
+        cbd.unpack(update.callback_query.data)
+    print(f"{'unpack only':>14}: {(time.perf_counter() - started) / len(updates) * 1e6:6.1f} us per callback")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""
+/export memory and time: exports the voter list after seeding `--voters` and
+again after seeding as many more, and compares peak Python heap (tracemalloc)
+of the two runs - with keyset pages it should not grow with the user count.
+Also exports the candidate and faculty totals once.
+
+    python -m benchmarks.bench_export [--voters 100000] [--format csv]
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+
+from benchmarks._sqlite import setup_sqlite, seed
+from models import db, User
+from services import repository
+from services.candidate_catalog import candidate_catalog
+from services.db_executor import db_executor
+from services.export import exporter
+
+
+async def _timed_export(kind: str, fmt: str):
+    tracemalloc.start()
+    started = time.perf_counter()
+    export = await exporter.export(kind, fmt)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    size = os.path.getsize(export.path)
+    os.remove(export.path)
+    print(f"{kind:>10} {fmt}: {export.rows:>8} rows  {elapsed:6.2f}s  {size / 1e6:7.2f} MB file  peak heap {peak / 1e6:6.2f} MB")
+    return export.rows, peak
+
+
+def _add_voters(n: int, candidate_ids: list[int]):
+    rnd = random.Random(2)
+    rows = [{"telegram_id": 30_000_000 + i, "first_name": f"extra{i}", "confedra_mudiri": rnd.choice(candidate_ids)} for i in range(n)]
+    with db.connection_context(), db.atomic():
+        for start in range(0, len(rows), 500):
+            User.insert_many(rows[start:start + 500]).execute()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--voters", type=int, default=100000)
+    parser.add_argument("--format", default="csv", choices=exporter.formats())
+    args = parser.parse_args()
+
+    setup_sqlite()
+    candidate_ids = seed(candidates_per_faculty=10, voters=args.voters)
+    await repository.journal_missing_votes()
+    await candidate_catalog.load()
+
+    await _timed_export("candidates", args.format)
+    await _timed_export("faculties", args.format)
+    rows_small, peak_small = await _timed_export("voters", args.format)
+    _add_voters(args.voters, candidate_ids)
+    rows_large, peak_large = await _timed_export("voters", args.format)
+    db_executor.shutdown()
+
+    if rows_large != 2 * rows_small:
+        raise SystemExit(f"FAILED: expected {2 * rows_small} voter rows, got {rows_large}")
+    if peak_large > peak_small * 1.5:
+        raise SystemExit("FAILED: peak memory grows with the number of voters")
+    print("OK: voter export memory does not grow with the number of voters")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
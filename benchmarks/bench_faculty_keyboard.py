@@ -0,0 +1,85 @@
+"""
+Faculty keyboard (mudir_tugmalari) cost for every FAKULTETLAR entry:
+
+  n+1        1 SELECT + 1 COUNT per candidate (original implementation)
+  grouped    one LEFT JOIN ... GROUP BY per keyboard
+  tally      rendered from the in-memory vote tally and catalog (current
+             implementation on a cache miss; hits are a dict lookup)
+
+    python -m benchmarks.bench_faculty_keyboard [--voters 5000] [--rounds 50]
+"""
+import time
+import asyncio
+import argparse
+
+from peewee import fn, JOIN
+
+from models import ConfidraMudiri, User
+from services.db_executor import db_executor
+from services.candidate_catalog import candidate_catalog
+from services.vote_tally import vote_tally
+from keyboards.inline_keyboards import FAKULTETLAR, candidate_markup
+from benchmarks._sqlite import setup_sqlite, seed
+
+
+def _faculty_n_plus_one(fakultet_id: int):
+    rows = ConfidraMudiri.select().where(ConfidraMudiri.facultet_type == fakultet_id).order_by(ConfidraMudiri.full_name)
+    return [(r.id, r.full_name, r.votes.count()) for r in rows]
+
+
+def _faculty_grouped(fakultet_id: int):
+    q = (
+        ConfidraMudiri
+        .select(ConfidraMudiri.id, ConfidraMudiri.full_name, fn.COUNT(User.id))
+        .join(User, JOIN.LEFT_OUTER, on=(User.confedra_mudiri == ConfidraMudiri.id))
+        .where(ConfidraMudiri.facultet_type == fakultet_id)
+        .group_by(ConfidraMudiri.id, ConfidraMudiri.full_name)
+        .order_by(ConfidraMudiri.full_name)
+        .tuples()
+    )
+    return list(q)
+
+
+async def _measure(label: str, sqlite, rounds: int, build):
+    sqlite.reset_count()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for fid in FAKULTETLAR:
+            await build(fid)
+    elapsed = time.perf_counter() - started
+    builds = rounds * len(FAKULTETLAR)
+    print(
+        f"{label:<8} queries/keyboard={sqlite.queries / builds:6.1f}  "
+        f"latency/keyboard={elapsed / builds * 1000:7.3f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, default=10, help="candidates per faculty")
+    parser.add_argument("--voters", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    sqlite = setup_sqlite()
+    seed(args.candidates, args.voters)
+
+    async def n_plus_one(fid):
+        return candidate_markup(await db_executor.run(_faculty_n_plus_one, fid))
+
+    async def grouped(fid):
+        return candidate_markup(await db_executor.run(_faculty_grouped, fid))
+
+    async def tally(fid):
+        # what mudir_tugmalari builds on a cache miss (after a vote in this faculty)
+        return candidate_markup((c.id, c.label, vote_tally.count(c.id)) for c in candidate_catalog.faculty(fid))
+
+    await _measure("n+1", sqlite, args.rounds, n_plus_one)
+    await _measure("grouped", sqlite, args.rounds, grouped)
+    await candidate_catalog.load()
+    await vote_tally.load()
+    await _measure("tally", sqlite, args.rounds, tally)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
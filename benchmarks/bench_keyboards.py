@@ -0,0 +1,62 @@
+"""
+Keyboard render cost per update: building markups with InlineKeyboardBuilder on
+every call (before) vs the cached markups in keyboards.inline_keyboards (after).
+
+    python -m benchmarks.bench_keyboards [--rounds 2000]
+"""
+import time
+import asyncio
+import argparse
+
+from keyboards import inline_keyboards as kb
+from benchmarks._sqlite import setup_sqlite, seed
+
+
+def _per_call(fn, rounds: int) -> float:
+    started = time.perf_counter()
+    for i in range(rounds):
+        fn(i)
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_sqlite()
+    candidate_ids = seed(candidates_per_faculty=10, voters=1000)
+    asyncio.run(kb.candidate_catalog.load())
+    asyncio.run(kb.vote_tally.load())
+    fids = list(kb.FAKULTETLAR)
+
+    cases = {
+        "fakultet": (
+            lambda i: kb._build_fakultet_markup(),
+            lambda i: kb.fakultet_tugmalari(),
+        ),
+        "mudir": (
+            lambda i: kb.candidate_markup(
+                (c.id, c.label, kb.vote_tally.count(c.id)) for c in kb.candidate_catalog.faculty(fids[i % len(fids)])
+            ),
+            lambda i: kb.mudir_tugmalari(fids[i % len(fids)]),
+        ),
+        "vote": (
+            lambda i: kb.vote_keyboard.__wrapped__(candidate_ids[i % len(candidate_ids)], 1),
+            lambda i: kb.vote_keyboard(candidate_ids[i % len(candidate_ids)], 1),
+        ),
+        "stats": (
+            lambda i: kb._build_stats_markup(),
+            lambda i: kb.stats_keyboard(),
+        ),
+        "sub_prompt": (
+            lambda i: kb._build_subscription_markup(),
+            lambda i: kb.subscription_keyboard(),
+        ),
+    }
+    for name, (before, after) in cases.items():
+        print(f"{name:<11} before={_per_call(before, args.rounds):8.1f} us  after={_per_call(after, args.rounds):8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
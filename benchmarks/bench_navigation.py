@@ -0,0 +1,120 @@
+"""
+Bot API calls per navigation flow. Synthetic users walk the menus through
+the real handlers against the fake Bot API, always pressing buttons on the
+newest message in their chat (as a user would), and the calls each flow
+costs are counted per method. The fake API refuses edits Telegram would
+refuse, so a wrong transition shows up as an error.
+
+    python -m benchmarks.bench_navigation [--users 200] [--photos | --no-photos]
+"""
+import asyncio
+import argparse
+import datetime
+
+from aiogram import Dispatcher
+from aiogram.types import Update
+
+from benchmarks._fake_api import FakeTelegramAPI
+from benchmarks._sqlite import setup_sqlite, seed
+from handlers import router
+from keyboards import callback_data as cbd
+from models import db, ConfidraMudiri
+from services import tasks
+from services.candidate_catalog import candidate_catalog
+from services.lifecycle import Lifecycle
+from services.user_buffer import user_buffer
+from services.vote_journal import vote_journal
+from services.vote_tally import vote_tally
+
+# name -> steps; a step is "/start" or a callback payload factory (faculty id, candidate id)
+FLOWS = {
+    "browse": ["/start", lambda f, m: cbd.Fakultet(f), lambda f, m: cbd.Mudir(m), lambda f, m: cbd.BackFakultet(f)],
+    "vote": ["/start", lambda f, m: cbd.Fakultet(f), lambda f, m: cbd.Mudir(m), lambda f, m: cbd.Vote(m),
+             lambda f, m: cbd.MainMenu()],
+    "compare": ["/start", lambda f, m: cbd.Fakultet(f), lambda f, m: cbd.Mudir(m), lambda f, m: cbd.BackFakultet(f),
+                lambda f, m: cbd.Fakultet(f), lambda f, m: cbd.Mudir(m + 1), lambda f, m: cbd.BackFakultet(f)],
+    "menus": ["/start", lambda f, m: cbd.Fakultet(f), lambda f, m: cbd.MainMenu(), lambda f, m: cbd.Fakultet(f),
+              lambda f, m: cbd.Fakultet(f)],
+}
+
+
+class FlowRunner:
+    def __init__(self, api: FakeTelegramAPI, bot, dp: Dispatcher):
+        self._api = api
+        self._bot = bot
+        self._dp = dp
+        self._update_id = 0
+        self.errors = 0
+
+    def _update(self, user_id: int, step) -> Update:
+        self._update_id += 1
+        user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+        now = int(datetime.datetime.now().timestamp())
+        if isinstance(step, str):
+            key, payload = "message", {
+                "message_id": 1, "date": now, "chat": {"id": user_id, "type": "private"}, "from": user, "text": step,
+            }
+        else:
+            message = dict(self._api.last_message(user_id))
+            message["from"] = {"id": self._bot.id, "is_bot": True, "first_name": "bot"}
+            key, payload = "callback_query", {
+                "id": str(self._update_id), "from": user, "chat_instance": "1", "message": message, "data": cbd.pack(step),
+            }
+        return Update.model_validate({"update_id": self._update_id, key: payload}, context={"bot": self._bot})
+
+    async def run(self, user_id: int, steps: list, fid: int, mid: int):
+        for step in steps:
+            step = step if isinstance(step, str) else step(fid, mid)
+            try:
+                await self._dp.feed_update(self._bot, self._update(user_id, step))
+            except Exception:
+                self.errors += 1
+            # deletes etc. spawned by the handler belong to this step
+            await tasks.drain(5)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200, help="users per flow")
+    parser.add_argument("--photos", action=argparse.BooleanOptionalAction, default=True, help="candidates have portraits")
+    args = parser.parse_args()
+
+    setup_sqlite()
+    seed(candidates_per_faculty=10, voters=0)
+    if args.photos:
+        with db.connection_context():
+            ConfidraMudiri.update(image="https://example.com/portrait.jpg").execute()
+
+    api = FakeTelegramAPI(global_rate=None, latency=0.0)
+    await api.start()
+    bot = api.bot()
+    dp = Dispatcher()
+    dp.include_router(router)
+    lifecycle = Lifecycle()
+    await lifecycle.startup(bot, services=(candidate_catalog, vote_tally, vote_journal, user_buffer), prepare=False, set_webhook=False)
+
+    candidates = candidate_catalog.faculty(1)
+    runner = FlowRunner(api, bot, dp)
+    results = {}
+    user_id = 40_000_000
+    try:
+        for name, steps in FLOWS.items():
+            before = dict(api.calls)
+            for i in range(args.users):
+                user_id += 1
+                await runner.run(user_id, steps, 1, candidates[i % (len(candidates) - 1)].id)
+            results[name] = {m: (api.calls.get(m, 0) - before.get(m, 0)) / args.users for m in api.calls if api.calls.get(m, 0) != before.get(m, 0)}
+    finally:
+        await lifecycle.shutdown(bot)
+        await api.stop()
+
+    print(f"API calls per flow ({'with' if args.photos else 'without'} portraits, {args.users} users per flow)")
+    for name, per_method in results.items():
+        methods = ", ".join(f"{m}={c:g}" for m, c in sorted(per_method.items(), key=lambda kv: -kv[1]))
+        print(f"  {name:<8} {len(FLOWS[name])} steps  {sum(per_method.values()):5.2f} calls   {methods}")
+    if runner.errors:
+        raise SystemExit(f"FAILED: {runner.errors} updates raised")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+SubscriptionMiddleware throughput under many simulated users.
+
+Every user sends a few messages; a small share of them spam until blocked, so
+block notifications (sent through a fake bot with artificial latency) run
+while everyone else keeps being served.
+
+    python -m benchmarks.bench_rate_limit [--users 10000] [--backend memory|shared]
+"""
+import time
+import asyncio
+import argparse
+import datetime
+
+from aiogram.types import Chat, Message, Update, User as TgUser
+
+from authMiddleware import SubscriptionMiddleware
+from services.rate_limiter import SharedRateLimiter
+from services.shared_state import MemoryStore
+
+
+class _Member:
+    status = "member"
+
+
+class FakeBot:
+    def __init__(self, latency: float):
+        self._latency = latency
+        self.sent = 0
+
+    async def get_chat_member(self, chat_id, user_id):
+        return _Member()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self._latency)
+        self.sent += 1
+        return Message(message_id=1, date=datetime.datetime.now(), chat=Chat(id=chat_id, type="private"), text=text)
+
+    async def delete_message(self, chat_id, message_id):
+        await asyncio.sleep(self._latency)
+
+
+def _update(update_id: int, user_id: int) -> Update:
+    user = TgUser(id=user_id, is_bot=False, first_name=f"u{user_id}")
+    message = Message(
+        message_id=update_id,
+        date=datetime.datetime.now(),
+        chat=Chat(id=user_id, type="private"),
+        from_user=user,
+        text="/start",
+    )
+    return Update(update_id=update_id, message=message)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=3, help="requests per regular user")
+    parser.add_argument("--spammers", type=float, default=0.02, help="share of users that get blocked")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake Telegram API latency, seconds")
+    parser.add_argument("--backend", choices=("memory", "shared"), default="memory")
+    args = parser.parse_args()
+
+    limiter = None
+    if args.backend == "shared":
+        limiter = SharedRateLimiter(MemoryStore(), limit_count=10, window_secs=20.0, block_secs=60.0)
+    middleware = SubscriptionMiddleware(rate_limiter=limiter)
+    bot = FakeBot(args.latency)
+
+    spammer_every = max(1, int(1 / args.spammers)) if args.spammers else 0
+    updates = []
+    for i in range(args.users):
+        uid = 1_000_000 + i
+        count = 15 if spammer_every and i % spammer_every == 0 else args.requests
+        updates.extend(_update(len(updates) + 1, uid) for _ in range(count))
+
+    handled = 0
+
+    async def handler(event, data):
+        nonlocal handled
+        handled += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(middleware(handler, u, {"bot": bot}) for u in updates))
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{len(updates)} updates from {args.users} users ({args.backend}): "
+        f"{len(updates) / elapsed:,.0f} updates/s, {handled} handled, "
+        f"{bot.sent} block notices sent in {elapsed:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
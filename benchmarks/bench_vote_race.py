@@ -0,0 +1,62 @@
+"""
+Fires concurrent votes at repository.cast_vote on the SQLite stand-in and
+checks that every user ends up with exactly one accepted vote.
+
+Half of the users already have a row (flushed by user_buffer), half do not,
+so both the conditional UPDATE and the insert fallback are raced.
+
+    python -m benchmarks.bench_vote_race [--users 200] [--taps 5]
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+
+from models import User, db
+from services import repository
+from benchmarks._sqlite import setup_sqlite, seed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--taps", type=int, default=5, help="simultaneous votes per user")
+    args = parser.parse_args()
+
+    sqlite = setup_sqlite()
+    candidate_ids = seed(candidates_per_faculty=5, voters=0)
+    user_ids = [50_000_000 + i for i in range(args.users)]
+    with db.connection_context():
+        User.insert_many([{"telegram_id": tid} for tid in user_ids[::2]]).execute()
+
+    rnd = random.Random(7)
+    calls = [(tid, rnd.choice(candidate_ids)) for tid in user_ids for _ in range(args.taps)]
+    rnd.shuffle(calls)
+
+    sqlite.reset_count()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        repository.cast_vote(tid, mid, defaults={"first_name": None, "last_name": None, "lang": "uz"})
+        for tid, mid in calls
+    ))
+    elapsed = time.perf_counter() - started
+
+    accepted = Counter(tid for (tid, _), ok in zip(calls, results) if ok)
+    with db.connection_context():
+        voted = User.select().where(User.telegram_id.in_(user_ids) & User.confedra_mudiri.is_null(False)).count()
+
+    print(
+        f"{len(calls)} votes from {args.users} users in {elapsed:.2f}s, "
+        f"{sqlite.queries / len(calls):.2f} statements/vote"
+    )
+    bad = [tid for tid in user_ids if accepted[tid] != 1]
+    if bad or voted != args.users:
+        print(f"FAIL: {len(bad)} users without exactly one accepted vote, {voted} users voted in DB")
+        sys.exit(1)
+    print("OK: exactly one accepted vote per user")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Tally recovery at startup: aggregate over users (before) vs vote checkpoint +
+journal tail (after). Seeds `--voters` votes, journals and checkpoints them,
+then adds `--tail` votes through VoteJournal as if cast after the checkpoint.
+Also times the journal repair (users anti-join votes), which runs only when
+the votes table is created and on main.py --repair-journal, not on every boot.
+
+    python -m benchmarks.bench_vote_recovery [--voters 200000] [--tail 2000]
+"""
+import time
+import random
+import asyncio
+import argparse
+
+from benchmarks._sqlite import setup_sqlite, seed
+from models import db, User
+from services import repository
+from services.db_executor import db_executor
+from services.vote_journal import VoteJournal
+
+
+async def _timed(fn, rounds: int):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        result = await fn()
+    return dict(result), (time.perf_counter() - started) / rounds * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--voters", type=int, default=200000)
+    parser.add_argument("--tail", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_sqlite()
+    candidate_ids = seed(candidates_per_faculty=10, voters=args.voters)
+    journaled = await repository.journal_missing_votes()
+    await repository.write_vote_checkpoint()
+
+    # votes after the checkpoint: in users and in the journal, not folded yet
+    rnd = random.Random(2)
+    journal = VoteJournal(flush_interval=0.5, max_batch=500, checkpoint_secs=60, series_minutes=60)
+    base = 90_000_000
+    rows = [{"telegram_id": base + i, "confedra_mudiri": rnd.choice(candidate_ids)} for i in range(args.tail)]
+    with db.connection_context(), db.atomic():
+        for start in range(0, len(rows), 500):
+            User.insert_many(rows[start:start + 500]).execute()
+    for row in rows:
+        journal.record(row["telegram_id"], row["confedra_mudiri"])
+    await journal.flush()
+
+    scan, scan_ms = await _timed(repository.candidate_tally, args.rounds)
+    replay, replay_ms = await _timed(repository.replay_votes, args.rounds)
+    repair_started = time.perf_counter()
+    for _ in range(args.rounds):
+        repaired = await repository.journal_missing_votes()
+    repair_ms = (time.perf_counter() - repair_started) / args.rounds * 1000
+    await journal.load_series()
+
+    print(f"{journaled} votes journaled + checkpointed, {args.tail} in the journal tail")
+    print(f"users scan:        {scan_ms:8.2f} ms")
+    print(f"checkpoint+replay: {replay_ms:8.2f} ms")
+    print(f"journal repair:    {repair_ms:8.2f} ms  (first boot / --repair-journal only, {repaired} missing)")
+    print(f"votes in the last minute (series): {journal.series(1)[0]}")
+    db_executor.shutdown()
+    if scan != replay:
+        raise SystemExit("FAILED: tallies differ")
+    if repaired:
+        raise SystemExit(f"FAILED: {repaired} votes were missing from the journal")
+    print("OK: identical tallies")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,198 @@
+"""
+End-to-end load test: the real Dispatcher with SubscriptionMiddleware,
+handlers.router and the metrics middlewares, against the local fake Bot API
+server, with the models bound to SQLite (default) or a scratch MySQL database.
+
+Every synthetic user walks the usual path - /start -> faculty -> candidate ->
+vote -> stats - with the next step sent once the previous one was handled;
+`--concurrency` users are active at once. Updates are parsed from dicts and
+fed to the dispatcher the way the webhook handler does it. Outbound calls go
+through ApiScheduler as in production, so every /start (a new message) is
+bound by the global message rate; --no-scheduler measures the handlers alone.
+
+    python -m benchmarks.loadtest [--users 2000] [--concurrency 200] [--latency 0.02]
+    python -m benchmarks.loadtest --db mysql --mysql-db tisu_loadtest   # drops and re-creates its tables!
+"""
+import time
+import random
+import asyncio
+import argparse
+import logging
+import datetime
+import statistics
+
+from aiogram import Dispatcher
+from aiogram.types import Update
+
+from authMiddleware import SubscriptionMiddleware
+from benchmarks._fake_api import FakeTelegramAPI, FAKE_TOKEN
+from benchmarks._sqlite import setup_sqlite, seed
+from config import Config
+from handlers import router
+from keyboards import callback_data as cbd
+from metricsMiddleware import setup_metrics
+from models import db, InstrumentedMySQLDatabase, ConfidraMudiri
+from services import metrics
+from services.api_scheduler import ApiScheduler
+from services.candidate_catalog import candidate_catalog
+from services.lifecycle import Lifecycle, MODELS
+from services.user_buffer import user_buffer
+from services.vote_journal import vote_journal
+from services.vote_tally import vote_tally
+
+BOT_USER = {"id": int(FAKE_TOKEN.split(":")[0]), "is_bot": True, "first_name": "bot"}
+
+
+def _setup_mysql(name: str):
+    db.initialize(InstrumentedMySQLDatabase(
+        name,
+        max_connections=Config.DB_POOL_SIZE,
+        user=Config.mysql_user,
+        password=Config.mysql_password,
+        host=Config.mysql_host,
+        port=Config.mysql_port,
+        charset='utf8mb4'
+    ))
+    with db.connection_context():
+        db.drop_tables(MODELS, safe=True)
+        db.create_tables(MODELS)
+
+
+class UserScript:
+    """Update dicts for one synthetic user's session."""
+
+    def __init__(self, user_id: int, candidates_by_faculty: dict, rnd: random.Random):
+        self.user_id = user_id
+        self._user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "language_code": "uz"}
+        fid = rnd.choice(list(candidates_by_faculty))
+        mid = rnd.choice(candidates_by_faculty[fid])
+        self.steps = [
+            ("start", self._message("/start")),
+            ("fakultet", self._callback(cbd.Fakultet(fid))),
+            ("mudir", self._callback(cbd.Mudir(mid))),
+            ("vote", self._callback(cbd.Vote(mid))),
+            ("stats", self._callback(cbd.Stats())),
+        ]
+
+    def _chat(self) -> dict:
+        return {"id": self.user_id, "type": "private"}
+
+    def _message(self, text: str) -> dict:
+        return {
+            "message_id": 1,
+            "date": int(datetime.datetime.now().timestamp()),
+            "chat": self._chat(),
+            "from": self._user,
+            "text": text,
+        }
+
+    def _callback(self, data) -> dict:
+        # pressed on a message the bot sent earlier
+        message = {
+            "message_id": 2,
+            "date": int(datetime.datetime.now().timestamp()),
+            "chat": self._chat(),
+            "from": BOT_USER,
+            "text": "...",
+        }
+        return {"id": f"{self.user_id}", "from": self._user, "chat_instance": "1", "message": message, "data": cbd.pack(data)}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200, help="users active at the same time")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake Bot API latency, seconds")
+    parser.add_argument("--candidates", type=int, default=10, help="candidates per faculty")
+    parser.add_argument("--photos", action="store_true", help="give candidates portraits (send_photo path)")
+    parser.add_argument("--scheduler", action=argparse.BooleanOptionalAction, default=True,
+                        help="shape API calls with ApiScheduler like serve()/poll() do (--no-scheduler: raw handler throughput)")
+    parser.add_argument("--db", choices=("sqlite", "mysql"), default="sqlite")
+    parser.add_argument("--mysql-db", default="tisu_loadtest")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("services.db_executor").setLevel(logging.ERROR)
+
+    if args.db == "mysql":
+        _setup_mysql(args.mysql_db)
+    else:
+        setup_sqlite()
+    seed(candidates_per_faculty=args.candidates, voters=0)
+    if args.photos:
+        with db.connection_context():
+            ConfidraMudiri.update(image="https://example.com/portrait.jpg").execute()
+
+    api = FakeTelegramAPI(global_rate=None, latency=args.latency)
+    await api.start()
+    bot = api.bot()
+    if args.scheduler:
+        bot.session.middleware(ApiScheduler())
+
+    lifecycle = Lifecycle()
+    dp = Dispatcher()
+    subscription_middleware = SubscriptionMiddleware()
+    dp.update.middleware(subscription_middleware)
+    dp.include_router(router)
+    setup_metrics(dp, bot)
+    await lifecycle.startup(
+        bot,
+        services=(candidate_catalog, vote_tally, vote_journal, user_buffer, subscription_middleware),
+        prepare=False,
+        set_webhook=False,
+    )
+
+    by_faculty = {}
+    for c in candidate_catalog.all():
+        by_faculty.setdefault(c.facultet_type, []).append(c.id)
+    rnd = random.Random(1)
+    scripts = [UserScript(20_000_000 + i, by_faculty, rnd) for i in range(args.users)]
+
+    latencies: dict[str, list[float]] = {}
+    update_ids = iter(range(1, 10 ** 9))
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_user(script: UserScript):
+        async with semaphore:
+            for step, payload in script.steps:
+                key = "message" if step == "start" else "callback_query"
+                raw = {"update_id": next(update_ids), key: payload}
+                started = time.perf_counter()
+                update = Update.model_validate(raw, context={"bot": bot})
+                await dp.feed_update(bot, update)
+                latencies.setdefault(step, []).append(time.perf_counter() - started)
+
+    queries_before = metrics.db_queries.value()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_user(s) for s in scripts))
+        elapsed = time.perf_counter() - started
+    finally:
+        # flushes the user buffer, so its upserts are counted too
+        await lifecycle.shutdown(bot)
+        await api.stop()
+    queries = metrics.db_queries.value() - queries_before
+
+    all_latencies = sorted(x for values in latencies.values() for x in values)
+    n = len(all_latencies)
+
+    def pct(values, p):
+        return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+    print(
+        f"{n} updates from {args.users} users ({args.db}, API latency {args.latency * 1000:.0f}ms, "
+        f"concurrency {args.concurrency}, {'with' if args.scheduler else 'without'} scheduler) "
+        f"in {elapsed:.2f}s: {n / elapsed:,.0f} updates/s"
+    )
+    print(f"latency p50 {pct(all_latencies, 0.5):.1f}ms  p99 {pct(all_latencies, 0.99):.1f}ms")
+    for step, values in latencies.items():
+        values.sort()
+        print(f"  {step:<9} p50 {pct(values, 0.5):7.1f}ms  p99 {pct(values, 0.99):7.1f}ms  mean {statistics.fmean(values) * 1000:7.1f}ms")
+    api_calls = sum(api.calls.values())
+    print(f"DB queries per update: {queries / n:.2f}   API calls per update: {api_calls / n:.2f}")
+    print("  " + ", ".join(f"{m}={c}" for m, c in sorted(api.calls.items(), key=lambda kv: -kv[1])))
+    print(f"votes recorded: {sum(vote_tally.count(c.id) for c in candidate_catalog.all())} / {args.users}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
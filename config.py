@@ -11,4 +11,92 @@ class Config:
     WEBHOOK_HOST  = "127.0.0.1"
     WEBHOOK_PORT  = 8080
     WEBHOOK_PATH  = "/webhook"
-    WEBHOOK_SECRET = "mysecret"
\ No newline at end of file
+    WEBHOOK_SECRET = "mysecret"
+    # /metrics listener, separate from the webhook port; keep it off public interfaces (None = not served).
+    # With WEBHOOK_WORKERS > 1 worker i listens on METRICS_PORT + i
+    METRICS_HOST = "127.0.0.1"
+    METRICS_PORT = 9090
+
+    # get_chat_member cache: members are re-checked rarely, non-members often
+    SUB_CACHE_POSITIVE_TTL = 300
+    SUB_CACHE_NEGATIVE_TTL = 15
+    SUB_CACHE_MAX_SIZE = 50000
+    # current bot message per user (id, photo/text, screen) for edit-in-place navigation
+    SCREEN_CACHE_TTL_SECS = 3600
+    SCREEN_CACHE_MAX_SIZE = 50000
+
+    # blocking peewee calls run on a thread pool of this size, one pooled connection each
+    DB_POOL_SIZE = 8
+    DB_STALE_TIMEOUT = 300
+    DB_SLOW_QUERY_SECS = 0.5
+
+    # write-behind user upserts: flush every N ms or once M rows are pending
+    USER_FLUSH_INTERVAL_MS = 500
+    USER_FLUSH_MAX_ROWS = 500
+    USER_KNOWN_MAX = 200000
+
+    # in-memory vote tally is re-read from the DB this often
+    TALLY_RECONCILE_SECS = 60
+
+    # private chat/channel the bot can post to; warm_photos.py uploads portraits there
+    PHOTO_CACHE_CHAT_ID = None
+
+    # middleware per-user state: expired entries swept this often, hard cap on tracked users
+    STATE_SWEEP_SECS = 60
+    STATE_MAX_USERS = 100000
+
+    # statistics text is re-rendered at most this often (and only after votes changed)
+    STATS_MIN_INTERVAL_SECS = 5
+
+    # webhook worker processes sharing WEBHOOK_PORT (SO_REUSEPORT); >1 needs a shared state backend
+    WEBHOOK_WORKERS = 1
+    # "local": per-process state only; "file": SQLite file shared by all workers on this host
+    SHARED_STATE_BACKEND = "local"
+    SHARED_STATE_PATH = "shared_state.db"
+    TALLY_SHARED_SYNC_SECS = 1
+
+    # shutdown waits this long for in-flight updates and background tasks
+    SHUTDOWN_DRAIN_SECS = 10
+
+    # --polling mode: updates processed at once / fetched but not yet finished
+    POLLING_MAX_IN_FLIGHT = 64
+    POLLING_MAX_PENDING = 1000
+
+    # outbound Bot API shaping (Telegram: ~30 messages/s per bot, ~1/s per chat)
+    # burst + rate must stay under the 30/s window, so the bucket runs a little below it
+    API_GLOBAL_RATE = 25.0
+    API_GLOBAL_BURST = 5
+    API_PER_CHAT_RATE = 1.0
+    API_PER_CHAT_BURST = 3
+    API_MAX_CHATS = 100000
+    # 429 handling: retries per request, longer retry_after is raised to the caller
+    API_MAX_RETRIES = 3
+    API_MAX_RETRY_AFTER = 60
+    # callback answers are useless once the user's spinner has timed out
+    API_CALLBACK_DEADLINE_SECS = 10
+
+    # telegram ids allowed to run /broadcast and /broadcast_status
+    ADMIN_IDS = ()
+    # broadcast: users read per keyset page (= checkpoint granularity), concurrent sends
+    BROADCAST_BATCH_SIZE = 500
+    BROADCAST_WORKERS = 16
+    # a running broadcast not refreshed for this long is resumed by another process
+    BROADCAST_LEASE_SECS = 60
+
+    # recently seen update_ids; a webhook retry of one of them is dropped
+    UPDATE_DEDUP_SIZE = 10000
+    UPDATE_DEDUP_TTL_SECS = 600
+
+    # candidate catalog reloads when this file's mtime changes (touch it after editing candidates)
+    CATALOG_WATCH_PATH = None
+    CATALOG_WATCH_SECS = 5
+
+    # vote journal: batched inserts into `votes`, tally checkpoints, votes-per-minute window
+    VOTE_JOURNAL_FLUSH_MS = 500
+    VOTE_JOURNAL_MAX_ROWS = 500
+    VOTE_CHECKPOINT_SECS = 60
+    VOTE_SERIES_MINUTES = 60
+
+    # /export: voter rows read per keyset page, directory for the files (None = system temp dir)
+    EXPORT_PAGE_SIZE = 2000
+    EXPORT_DIR = None
@@ -1,8 +1,10 @@
 from aiogram import Router
 from .start_handler import router as start_router
+from .admin_handler import router as admin_router
 
 router = Router(name=__name__)
 
 router.include_routers(
+    admin_router,
     start_router
 )
\ No newline at end of file
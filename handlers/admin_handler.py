@@ -0,0 +1,95 @@
+import os
+
+from aiogram import Router, types, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile
+
+from config import Config
+from services import repository
+from services.broadcast import broadcaster
+from services.candidate_catalog import candidate_catalog
+from services.export import exporter, ExportFile, KINDS
+
+# sendDocument limit for bots
+DOCUMENT_MAX_BYTES = 50 * 1024 * 1024
+
+router = Router(name=__name__)
+router.message.filter(F.from_user.id.in_(Config.ADMIN_IDS))
+
+
+def _format_status(job, progress: dict = None) -> str:
+    # the row is saved once per page; the sending process has fresher counters
+    counts = progress or {"sent": job.sent, "failed": job.failed, "blocked": job.blocked}
+    done = counts["sent"] + counts["failed"] + counts["blocked"]
+    lines = [
+        f"📣 <b>Xabar #{job.id}</b>: {job.status}",
+        f"Yuborildi: {counts['sent']}, bloklagan: {counts['blocked']}, xato: {counts['failed']}",
+        f"Jami: {done} / {job.total}",
+    ]
+    if progress is not None:
+        eta = f"{progress['eta_secs'] / 60:.1f} daqiqa" if progress["eta_secs"] is not None else "?"
+        lines.append(f"Tezlik: {progress['rate']:.1f} xabar/s, qolgan vaqt: {eta}")
+    return "\n".join(lines)
+
+
+@router.message(Command("broadcast"))
+async def broadcast_handler(message: types.Message, command: CommandObject):
+    text = message.html_text.split(maxsplit=1)[1] if command.args else ""
+    if not text:
+        await message.answer("Foydalanish: /broadcast <matn>")
+        return
+
+    latest = await repository.get_broadcast()
+    if latest is not None and latest.status == "running":
+        await message.answer(f"Xabar #{latest.id} hali yuborilmoqda, /broadcast_status")
+        return
+
+    job_id = await broadcaster.create(text)
+    await message.answer(f"📣 Xabar #{job_id} yuborish boshlandi. Holat: /broadcast_status")
+
+
+@router.message(Command("broadcast_status"))
+async def broadcast_status_handler(message: types.Message):
+    job = await repository.get_broadcast()
+    if job is None:
+        await message.answer("Hali xabar yuborilmagan.")
+        return
+
+    # live rate/ETA only in the process that is sending it
+    run = broadcaster.current
+    progress = run.progress() if run is not None and run.job_id == job.id else None
+    await message.answer(_format_status(job, progress), parse_mode="HTML")
+
+
+@router.message(Command("reload_candidates"))
+async def reload_candidates_handler(message: types.Message):
+    changed = await candidate_catalog.reload()
+    status = "yangilandi" if changed else "o'zgarish yo'q"
+    await message.answer(f"Nomzodlar ro'yxati: {status} ({len(candidate_catalog)} ta).")
+
+
+@router.message(Command("export"))
+async def export_handler(message: types.Message, command: CommandObject):
+    args = (command.args or "").split()
+    kind = args[0] if args else "candidates"
+    fmt = args[1] if len(args) > 1 else "csv"
+    if kind not in KINDS or fmt not in exporter.formats():
+        await message.answer(f"Foydalanish: /export [{'|'.join(KINDS)}] [{'|'.join(exporter.formats())}]")
+        return
+
+    async def deliver(export: ExportFile):
+        if os.path.getsize(export.path) > DOCUMENT_MAX_BYTES:
+            await message.answer("Fayl 50 MB dan katta, Telegram orqali yuborib bo'lmaydi.")
+            return
+        await message.answer_document(
+            FSInputFile(export.path, filename=export.filename),
+            caption=f"{export.filename}: {export.rows} qator",
+        )
+
+    async def fail(error: Exception):
+        await message.answer(f"Eksport xatosi: {error}")
+
+    if not exporter.launch(kind, fmt, deliver, fail):
+        await message.answer("Boshqa eksport hali tayyorlanmoqda, keyinroq urinib ko'ring.")
+        return
+    await message.answer("⏳ Eksport tayyorlanmoqda, fayl shu yerga yuboriladi.")
@@ -1,9 +1,17 @@
-from aiogram import Router, types, F
+import time
+
+from aiogram import Router, types
 from aiogram.filters import Command
 from aiogram.types import CallbackQuery
-from models import ConfidraMudiri, db, User
-from peewee import fn, JOIN
-from config import Config
+from aiogram.exceptions import TelegramBadRequest
+from keyboards import callback_data as cbd
+from services import metrics, repository
+from services.candidate_catalog import candidate_catalog
+from services.screens import screen_cache
+from services.stats_snapshot import stats_snapshot, content_digest
+from services.subscription_cache import subscription_cache
+from services.vote_journal import vote_journal
+from services.vote_tally import vote_tally
 
 from keyboards.inline_keyboards import (
     fakultet_tugmalari,
@@ -11,44 +19,61 @@ from keyboards.inline_keyboards import (
     get_fakultet_name_by_id,
     vote_keyboard,
     stats_keyboard,
+    main_menu_keyboard,
     FAKULTETLAR
 )
 
 router = Router(name=__name__)
 
+# callback payload type -> handler(call, data); see route_callback
+CALLBACK_ROUTES = {}
+
+
+def callback_route(data_type):
+    def register(handler):
+        CALLBACK_ROUTES[data_type] = handler
+        return handler
+    return register
+
+
+@router.callback_query()
+async def route_callback(call: CallbackQuery):
+    # every button press: one parse, one dict lookup (instead of a filter per handler)
+    data = cbd.unpack(call.data)
+    if data is None:
+        await call.answer("Noto'g'ri ma'lumot.", show_alert=True)
+        return
+
+    handler = CALLBACK_ROUTES[type(data)]
+    started = time.perf_counter()
+    try:
+        return await handler(call, data)
+    except Exception:
+        metrics.handler_errors.inc(handler.__name__)
+        raise
+    finally:
+        metrics.handler_seconds.observe(time.perf_counter() - started, handler.__name__)
+
+
 WELCOME_TEXT = (
     "<b>🎓 TISU So'rovnoma</b>\n\n"
     "<b>Iltimos, ovoz berish uchun kerakli fakultetni tanlang.</b>\n\n"
     "<b>Quyidagi ro'yxatdan boshlang — keyin kafedralar ro'yxati chiqadi.</b>"
 )
+# screen names for screen_cache; versioned where the content changes (vote counts, catalog)
+WELCOME_SCREEN = ("welcome",)
 
-@router.callback_query(F.data == "check_sub")
-async def check_subscription(callback: CallbackQuery):
+@callback_route(cbd.CheckSub)
+async def check_subscription(callback: CallbackQuery, data: cbd.CheckSub):
     bot = callback.message.bot
     user_id = callback.from_user.id
 
-    try:
-        member = await bot.get_chat_member(Config.CHANNEL_ID, user_id)
-        is_subscribed = member.status in ("creator", "administrator", "member", "restricted")
-    except Exception:
-        is_subscribed = False
+    # SubscriptionMiddleware has just refreshed the cache for "check_sub"
+    is_subscribed = bool(await subscription_cache.is_subscribed(bot, user_id))
 
     if is_subscribed:
         await callback.answer("✔ Obuna tasdiqlandi!", show_alert=False)
-
-        try:
-            await callback.message.edit_text(
-                WELCOME_TEXT,
-                parse_mode="HTML",
-                reply_markup=fakultet_tugmalari()
-            )
-        except:
-            await callback.message.answer(
-                WELCOME_TEXT,
-                parse_mode="HTML",
-                reply_markup=fakultet_tugmalari()
-            )
-
+        await screen_cache.show(callback.message, user_id, WELCOME_SCREEN, WELCOME_TEXT, fakultet_tugmalari())
         return
 
     await callback.answer("❗ Obuna topilmadi", show_alert=False)
@@ -60,7 +85,7 @@ async def check_subscription(callback: CallbackQuery):
             parse_mode="HTML",
             reply_markup=callback.message.reply_markup
         )
-    except:
+    except TelegramBadRequest:
         await callback.message.answer(
             "❌ Siz hali kanalga obuna bo‘lmagansiz.\n\n"
             "📢 Iltimos, obuna bo‘ling va qayta tekshiring.",
@@ -70,158 +95,111 @@ async def check_subscription(callback: CallbackQuery):
 
 @router.message(Command("start"))
 async def start_handler(message: types.Message):
-    await message.answer(
+    sent = await message.answer(
         WELCOME_TEXT,
         reply_markup=fakultet_tugmalari(),
         parse_mode="HTML"
     )
+    screen_cache.remember(message.from_user.id, sent, WELCOME_SCREEN)
 
 
-@router.callback_query(lambda c: c.data and c.data.startswith("back_fakultet:"))
-async def back_fakultet_handler(call: CallbackQuery):
-    await call.message.answer(
-        WELCOME_TEXT,
-        reply_markup=fakultet_tugmalari(),
-        parse_mode="HTML"
-    )
-    await call.message.delete()
+@callback_route(cbd.BackFakultet)
+async def back_fakultet_handler(call: CallbackQuery, data: cbd.BackFakultet):
+    await screen_cache.show(call.message, call.from_user.id, WELCOME_SCREEN, WELCOME_TEXT, fakultet_tugmalari())
     await call.answer()
 
-@router.callback_query(lambda c: c.data and c.data.startswith("fakultet:"))
-async def fakultet_callback(call: CallbackQuery):
-    try:
-        fid = int(call.data.split(":", 1)[1])
-    except (IndexError, ValueError):
-        await call.answer("Noto'g'ri ma'lumot.", show_alert=True)
-        return
-
+@callback_route(cbd.Fakultet)
+async def fakultet_callback(call: CallbackQuery, data: cbd.Fakultet):
+    fid = data.fakultet_id
     fakultet_name = get_fakultet_name_by_id(fid) or "Tanlangan fakultet"
-    await call.message.edit_text(
+    await screen_cache.show(
+        call.message,
+        call.from_user.id,
+        ("fakultet", fid, vote_tally.faculty_version(fid)),
         f"🏛️ <b>{fakultet_name}</b>\n\n"
         "Quyidagi kafedralardan birini tanlang:",
-        reply_markup=mudir_tugmalari(fid),
-        parse_mode="HTML"
+        mudir_tugmalari(fid),
     )
     await call.answer()
 
-@router.callback_query(lambda c: c.data and c.data.startswith("mudir:"))
-async def mudir_detail(cb: CallbackQuery):
+@callback_route(cbd.Mudir)
+async def mudir_detail(cb: CallbackQuery, data: cbd.Mudir):
     try:
-        _, mid = cb.data.split(":", 1)
-        db.connect(reuse_if_open=True)
-        mudir = ConfidraMudiri.get_or_none(ConfidraMudiri.id == int(mid))
-        vote_button = vote_keyboard(mudir_id=mudir.id, facultet_id=mudir.facultet_type)
+        mudir = candidate_catalog.get(data.mudir_id)
         if not mudir:
             await cb.answer("Nomzod topilmadi.", show_alert=True)
             return
+        vote_button = vote_keyboard(mudir_id=mudir.id, facultet_id=mudir.facultet_type)
         text = (
             f"🧑‍🏫 <b>{mudir.full_name}</b>\n"
             f"🏫 <b>Fakultet:</b> {FAKULTETLAR.get(mudir.facultet_type, mudir.facultet_type)}\n\n"
             f"📝 <b>Maʼlumot:</b>\n"
             f"{mudir.description or 'Hozircha izoh mavjud emas.'}"
         )
+        screen = ("mudir", mudir.id, candidate_catalog.version)
         if mudir.image:
             try:
-                await cb.message.answer_photo(photo=mudir.image, caption=text, parse_mode="HTML", reply_markup=vote_button)
+                # portrait uploaded once, then sent by cached file_id
+                await screen_cache.show(cb.message, cb.from_user.id, screen, text, vote_button, photo=(mudir.id, mudir.image))
             except Exception:
-                await cb.message.answer(text, parse_mode="HTML", reply_markup=vote_button)
+                await screen_cache.show(cb.message, cb.from_user.id, screen, text, vote_button)
         else:
-            await cb.message.answer(text, parse_mode="HTML", reply_markup=vote_button)
+            await screen_cache.show(cb.message, cb.from_user.id, screen, text, vote_button)
         await cb.answer()
-        await cb.message.delete()
     except Exception:
         await cb.answer("Xatolik yuz berdi.", show_alert=True)
 
-@router.callback_query(lambda c: c.data == "main_menu")
-async def main_menu_handler(call: CallbackQuery):
-    await call.message.edit_text(
-        WELCOME_TEXT,
-        reply_markup=fakultet_tugmalari(),
-        parse_mode="HTML"
-    )
+@callback_route(cbd.MainMenu)
+async def main_menu_handler(call: CallbackQuery, data: cbd.MainMenu):
+    await screen_cache.show(call.message, call.from_user.id, WELCOME_SCREEN, WELCOME_TEXT, fakultet_tugmalari())
     await call.answer()
 
 
-@router.callback_query(lambda c: c.data and c.data.startswith("vote:"))
-async def vote_handler(call: CallbackQuery):
-    try:
-        mudir_id = int(call.data.split(":", 1)[1])
-    except (IndexError, ValueError):
-        await call.answer("Noto'g'ri ma'lumot.", show_alert=True)
-        return
+@callback_route(cbd.Vote)
+async def vote_handler(call: CallbackQuery, data: cbd.Vote):
+    mudir_id = data.mudir_id
 
-    db.connect(reuse_if_open=True)
-    mudir = ConfidraMudiri.get_or_none(ConfidraMudiri.id == mudir_id)
-    if not mudir:
+    # candidate index is in memory; casting the vote is one conditional statement
+    candidate = candidate_catalog.get(mudir_id)
+    if candidate is None:
         await call.answer("Nomzod topilmadi.", show_alert=True)
         return
 
-    tg_id = call.from_user.id
-    user = User.get_or_none(User.telegram_id == tg_id)
-
-    if not user:
-        user = User.create(
-            telegram_id=tg_id,
-            first_name=call.from_user.first_name,
-            last_name=call.from_user.last_name,
-            lang=call.from_user.language_code or "uz"
-        )
-
-    if user.confedra_mudiri_id:
+    accepted = await repository.cast_vote(
+        call.from_user.id,
+        mudir_id,
+        defaults={
+            "first_name": call.from_user.first_name,
+            "last_name": call.from_user.last_name,
+            "lang": call.from_user.language_code or "uz",
+        }
+    )
+    if not accepted:
         await call.answer("Siz allaqachon ovoz bergansiz.", show_alert=True)
         return
 
-    user.confedra_mudiri = mudir.id
-    user.save()
-
-    text = f"🎉 Siz <b>{mudir.full_name}</b> uchun ovoz berdingiz. Rahmat!"
-    markup = types.InlineKeyboardMarkup(
-        inline_keyboard=[
-            [types.InlineKeyboardButton(text="🏠 Asosiy menyu", callback_data="main_menu")]
-        ]
-    )
+    vote_tally.increment(mudir_id)
+    vote_journal.record(call.from_user.id, mudir_id)
 
-    try:
-        await call.message.delete()
-    except Exception:
-        pass
-
-    await call.message.answer(
-        text,
-        parse_mode="HTML",
-        reply_markup=markup
-    )
+    text = f"🎉 Siz <b>{candidate.full_name}</b> uchun ovoz berdingiz. Rahmat!"
 
+    # the thank-you becomes the caption of the candidate's portrait
+    await screen_cache.show(call.message, call.from_user.id, ("voted", mudir_id), text, main_menu_keyboard(), keep_photo=True)
     await call.answer("Ovoz qabul qilindi ✅")
 
-@router.callback_query(lambda c: c.data == "stats")
-async def stats_handler(cb: CallbackQuery):
-    db.connect(reuse_if_open=True)
-
-    q = (
-        ConfidraMudiri
-        .select(
-            ConfidraMudiri,
-            fn.COUNT(User.id).alias("votes_count")
-        )
-        .join(User, JOIN.LEFT_OUTER, on=(User.confedra_mudiri == ConfidraMudiri.id))
-        .group_by(ConfidraMudiri.id)
-        .order_by(fn.COUNT(User.id).desc())
-    )
-
-    lines = ["📊 <b>Ovozlar Statistikasi</b>\n"]
-
-    rank = 1
-    for r in q:
-        count = r.votes_count or 0
-        lines.append(f"{rank}. {r.full_name} — <b>{count}</b> ta")
-        rank += 1
-
-    text = "\n".join(lines)
-
-    await cb.message.edit_text(
-        text,
-        parse_mode="HTML",
-        reply_markup=stats_keyboard()
-    )
-    await cb.answer()
\ No newline at end of file
+@callback_route(cbd.Stats)
+async def stats_handler(cb: CallbackQuery, data: cbd.Stats):
+    # no fakultet_id -> all candidates
+    fid = data.fakultet_id
+    if fid is None:
+        snapshot = stats_snapshot.get()
+    else:
+        snapshot = stats_snapshot.get(fid, title=get_fakultet_name_by_id(fid) or "Tanlangan fakultet")
+
+    screen = ("stats", fid, snapshot.digest)
+    if content_digest(cb.message.text) == snapshot.digest:
+        # same text already on screen -> no edit (Telegram would reject it anyway)
+        screen_cache.remember(cb.from_user.id, cb.message, screen)
+    else:
+        await screen_cache.show(cb.message, cb.from_user.id, screen, snapshot.html, stats_keyboard())
+    await cb.answer()
@@ -0,0 +1,73 @@
+"""
+Typed inline-button payloads. The wire format is "<prefix>" or
+"<prefix>:<int>" (unchanged from the plain strings used before, so buttons in
+old messages keep working); unpack() parses it once with a dict lookup on
+the prefix.
+"""
+from typing import NamedTuple, Optional
+
+
+class Fakultet(NamedTuple):
+    fakultet_id: int
+    prefix = "fakultet"
+
+
+class Mudir(NamedTuple):
+    mudir_id: int
+    prefix = "mudir"
+
+
+class Vote(NamedTuple):
+    mudir_id: int
+    prefix = "vote"
+
+
+class BackFakultet(NamedTuple):
+    fakultet_id: int
+    prefix = "back_fakultet"
+
+
+class Stats(NamedTuple):
+    # None -> all candidates
+    fakultet_id: Optional[int] = None
+    prefix = "stats"
+
+
+class MainMenu(NamedTuple):
+    prefix = "main_menu"
+
+
+class CheckSub(NamedTuple):
+    prefix = "check_sub"
+
+
+TYPES = (Fakultet, Mudir, Vote, BackFakultet, Stats, MainMenu, CheckSub)
+_BY_PREFIX = {t.prefix: t for t in TYPES}
+
+
+def pack(cb) -> str:
+    if not cb or cb[0] is None:
+        return cb.prefix
+    return f"{cb.prefix}:{cb[0]}"
+
+
+def unpack(data: Optional[str]):
+    """Typed payload, or None for anything malformed or unknown."""
+    if not data:
+        return None
+    prefix, sep, arg = data.partition(":")
+    cls = _BY_PREFIX.get(prefix)
+    if cls is None:
+        return None
+    if not sep:
+        # no argument: valid only for types whose field is optional (or that have none)
+        try:
+            return cls()
+        except TypeError:
+            return None
+    if not cls._fields:
+        return None
+    try:
+        return cls(int(arg))
+    except ValueError:
+        return None
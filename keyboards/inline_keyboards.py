@@ -1,6 +1,11 @@
+from functools import lru_cache
+
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from aiogram.types import InlineKeyboardButton
-from models import ConfidraMudiri, db
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from config import Config
+from keyboards.callback_data import pack, Fakultet, Mudir, Vote, BackFakultet, Stats, MainMenu, CheckSub
+from services.candidate_catalog import candidate_catalog
+from services.vote_tally import vote_tally
 
 FAKULTETLAR = {
     1: "Iqtisodiyot va axborot texnologiyalari fakulteti",
@@ -8,49 +13,91 @@ FAKULTETLAR = {
     3: "Tibbiyot fakulteti",
 }
 
-def fakultet_tugmalari():
-    """
-    Inline markup: har bir tugma callback_data: 'fakultet:<id>'
-    """
+# Markups are built once and shared by every update - never mutate a returned markup.
+
+def _build_fakultet_markup():
     kb = InlineKeyboardBuilder()
     for fid, name in FAKULTETLAR.items():
         kb.add(
             InlineKeyboardButton(
                 text=name,
-                callback_data=f"fakultet:{fid}"
+                callback_data=pack(Fakultet(fid))
             )
         )
-    
+
     kb.add(
         InlineKeyboardButton(
             text="📊 Statistika",
-            callback_data="stats"
+            callback_data=pack(Stats())
         )
     )
     kb.adjust(1)
     return kb.as_markup()
 
+def _build_single_button_markup(text: str, callback_data: str):
+    kb = InlineKeyboardBuilder()
+    kb.add(InlineKeyboardButton(text=text, callback_data=callback_data))
+    kb.adjust(1)
+    return kb.as_markup()
+
+def _build_stats_markup():
+    # per-faculty breakdowns are rendered from the same in-memory tally
+    kb = InlineKeyboardBuilder()
+    kb.add(InlineKeyboardButton(text="📊 Umumiy", callback_data=pack(Stats())))
+    for fid, name in FAKULTETLAR.items():
+        kb.add(InlineKeyboardButton(text=name, callback_data=pack(Stats(fid))))
+    kb.add(InlineKeyboardButton(text="🏠 Bosh sahifa", callback_data=pack(MainMenu())))
+    kb.adjust(1)
+    return kb.as_markup()
+
+def _build_subscription_markup():
+    kb_buttons = []
+    chan_username = getattr(Config, "CHANNEL_USERNAME", None)
+    if chan_username:
+        kb_buttons.append(InlineKeyboardButton(text="Kanalga o‘tish", url=f"https://t.me/{chan_username}"))
+    kb_buttons.append(InlineKeyboardButton(text="Obunani tekshirish", callback_data=pack(CheckSub())))
+    return InlineKeyboardMarkup(inline_keyboard=[[b] for b in kb_buttons])
+
+_FAKULTET_MARKUP = _build_fakultet_markup()
+_STATS_MARKUP = _build_stats_markup()
+_MAIN_MENU_MARKUP = _build_single_button_markup("🏠 Asosiy menyu", pack(MainMenu()))
+_SUBSCRIPTION_MARKUP = _build_subscription_markup()
+
+# fakultet_id -> (tally faculty version, markup)
+_faculty_markups: dict[int, tuple[int, InlineKeyboardMarkup]] = {}
+
+def fakultet_tugmalari():
+    """
+    Inline markup: har bir tugma callback_data: 'fakultet:<id>'
+    """
+    return _FAKULTET_MARKUP
+
 def mudir_tugmalari(fakultet_id: int):
-    db.connect(reuse_if_open=True)
-    rows = ConfidraMudiri.select().where(ConfidraMudiri.facultet_type == fakultet_id).order_by(ConfidraMudiri.full_name)
+    # rebuilt only after a vote/reload changed this faculty's counts
+    version = vote_tally.faculty_version(fakultet_id)
+    cached = _faculty_markups.get(fakultet_id)
+    if cached and cached[0] == version:
+        return cached[1]
+    markup = candidate_markup(
+        (c.id, c.label, vote_tally.count(c.id)) for c in candidate_catalog.faculty(fakultet_id)
+    )
+    _faculty_markups[fakultet_id] = (version, markup)
+    return markup
+
+def candidate_markup(rows):
+    """rows: (id, button label, votes) ordered for display"""
     kb = InlineKeyboardBuilder()
-    for r in rows:
-        try:
-            votes = r.votes.count()
-        except Exception:
-            votes = 0
-        name = r.full_name
-        if len(name) > 18:
-            name = name[:15] + "..."
-        kb.add(InlineKeyboardButton(text=f"{name} ({votes})", callback_data=f"mudir:{r.id}"))
-    kb.add(InlineKeyboardButton(text="🏠 Asosiy menyu", callback_data="main_menu"))
+    for mid, label, votes in rows:
+        kb.add(InlineKeyboardButton(text=f"{label} ({votes})", callback_data=pack(Mudir(mid))))
+    kb.add(InlineKeyboardButton(text="🏠 Asosiy menyu", callback_data=pack(MainMenu())))
     kb.adjust(1)
     return kb.as_markup()
 
+@lru_cache(maxsize=512)
 def vote_keyboard(mudir_id: int, facultet_id: int):
     kb = InlineKeyboardBuilder()
-    kb.add(InlineKeyboardButton(text="🗳 Ovoz berish", callback_data=f"vote:{mudir_id}"))
-    kb.add(InlineKeyboardButton(text="⬅️ Orqaga", callback_data=f"back_fakultet:{facultet_id}"))
+    kb.add(InlineKeyboardButton(text="🗳 Ovoz berish", callback_data=pack(Vote(mudir_id))))
+    kb.add(InlineKeyboardButton(text="⬅️ Orqaga", callback_data=pack(BackFakultet(facultet_id))))
     kb.adjust(1)
     return kb.as_markup()
 
@@ -58,12 +105,10 @@ def get_fakultet_name_by_id(fid: int) -> str | None:
     return FAKULTETLAR.get(fid)
 
 def stats_keyboard():
-    kb = InlineKeyboardBuilder()
-    kb.add(
-        InlineKeyboardButton(
-            text="🏠 Bosh sahifa",
-            callback_data="main_menu"
-        )
-    )
-    kb.adjust(1)
-    return kb.as_markup()
\ No newline at end of file
+    return _STATS_MARKUP
+
+def main_menu_keyboard():
+    return _MAIN_MENU_MARKUP
+
+def subscription_keyboard():
+    return _SUBSCRIPTION_MARKUP
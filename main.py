@@ -4,41 +4,233 @@ from aiohttp import web
 from config import Config
 from authMiddleware import SubscriptionMiddleware
 from handlers import router
-from models import db, ConfidraMudiri, User
+from metricsMiddleware import setup_metrics, start_metrics_server
+from services import repository
+from services.api_scheduler import ApiScheduler
+from services.broadcast import broadcaster
+from services.candidate_catalog import candidate_catalog
+from services.db_executor import db_executor
+from services.lifecycle import Lifecycle
+from services.update_dedup import update_dedup
+from services.update_scheduler import UpdateScheduler
+from services.shared_state import MemoryStore, shared_store
+from services.user_buffer import user_buffer
+from services.vote_journal import vote_journal
+from services.vote_tally import vote_tally
+import argparse
 import asyncio
 import logging
+import multiprocessing
+import signal
 
-async def main():
-    db.connect()
-    db.create_tables([ConfidraMudiri, User])
+LOG = logging.getLogger(__name__)
+
+
+def _install_signal_handlers() -> asyncio.Event:
+    """SIGINT/SIGTERM set the returned event; kill -HUP re-reads the candidates table."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    loop.add_signal_handler(signal.SIGHUP, candidate_catalog.request_reload)
+    return stop
 
+
+async def serve(prepare: bool = True, set_webhook: bool = True, reuse_port: bool = False, worker: int = 0):
+    lifecycle = Lifecycle()
     bot = Bot(token=Config.BOT_TOKEN)
     dp = Dispatcher()
-    dp.update.middleware(SubscriptionMiddleware())
+    # webhook retries of an update already taken are dropped before anything else runs
+    dp.update.outer_middleware(update_dedup)
+    dp.update.outer_middleware(lifecycle.track_updates)
+    subscription_middleware = SubscriptionMiddleware()
+    dp.update.middleware(subscription_middleware)
     dp.include_router(router)
+    # each worker gets its share of the bot-wide message rate and burst (a burst
+    # needs at least one token, so more workers than API_GLOBAL_BURST exceed it slightly)
+    workers = Config.WEBHOOK_WORKERS if reuse_port else 1
+    bot.session.middleware(ApiScheduler(
+        global_rate=Config.API_GLOBAL_RATE / workers,
+        global_burst=max(1, Config.API_GLOBAL_BURST // workers),
+    ))
 
     app = web.Application()
-    handler = SimpleRequestHandler(dp, bot, secret_token=Config.WEBHOOK_SECRET)
+    handler = SimpleRequestHandler(
+        dp,
+        bot,
+        # aiogram's default handle_in_background=True: the webhook is answered at
+        # once, so a slow handler never makes Telegram redeliver
+        secret_token=Config.WEBHOOK_SECRET
+    )
     handler.register(app, path=Config.WEBHOOK_PATH)
     setup_application(app, dp, bot=bot)
+    setup_metrics(dp, bot)
 
-    await bot.set_webhook(
-        url=Config.WEBHOOK_URL,
-        secret_token=Config.WEBHOOK_SECRET
-    )
+    broadcaster.set_bot(bot)
 
-    runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(
-        runner,
-        host=Config.WEBHOOK_HOST,
-        port=Config.WEBHOOK_PORT
-    )
-    await site.start()
+    # before startup, so a stop during warm-up still flushes and closes below
+    stop = _install_signal_handlers()
+    runner = site = metrics_runner = None
+    try:
+        # schema/webhook checks, then caches warmed before the port is opened
+        await lifecycle.startup(
+            bot,
+            services=(candidate_catalog, vote_tally, vote_journal, user_buffer, subscription_middleware, broadcaster),
+            prepare=prepare,
+            set_webhook=set_webhook,
+        )
+        if stop.is_set():
+            LOG.info("Stop requested during startup, not opening the port")
+            return
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(
+            runner,
+            host=Config.WEBHOOK_HOST,
+            port=Config.WEBHOOK_PORT,
+            # every worker binds the same port; the kernel spreads connections between them
+            reuse_port=reuse_port
+        )
+        await site.start()
+        metrics_runner = await start_metrics_server(worker)
+        lifecycle.ready()
+
+        await stop.wait()
+    finally:
+        # stop accepting new requests, finish what is running, then flush and close
+        if site is not None:
+            await site.stop()
+        await lifecycle.shutdown(bot)
+        if runner is not None:
+            await runner.cleanup()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+
+async def poll():
+    """Long-polling instead of the webhook: same Dispatcher, middleware and router."""
+    lifecycle = Lifecycle()
+    bot = Bot(token=Config.BOT_TOKEN)
+    dp = Dispatcher()
+    dp.update.outer_middleware(lifecycle.track_updates)
+    # concurrent across users, sequential per user
+    dp.update.outer_middleware(UpdateScheduler(max_in_flight=Config.POLLING_MAX_IN_FLIGHT))
+    subscription_middleware = SubscriptionMiddleware()
+    dp.update.middleware(subscription_middleware)
+    dp.include_router(router)
+    bot.session.middleware(ApiScheduler())
+    setup_metrics(dp, bot)
+
+    broadcaster.set_bot(bot)
+    stop = _install_signal_handlers()
+    metrics_runner = None
+    try:
+        await lifecycle.startup(
+            bot,
+            services=(candidate_catalog, vote_tally, vote_journal, user_buffer, subscription_middleware, broadcaster),
+            set_webhook=False,
+        )
+        # getUpdates is refused while a webhook is set
+        await bot.delete_webhook(drop_pending_updates=False)
+        if stop.is_set():
+            LOG.info("Stop requested during startup, not polling")
+            return
+        metrics_runner = await start_metrics_server()
+        lifecycle.ready()
+
+        # start_polling replaces the SIGINT/SIGTERM handlers with its own
+        await dp.start_polling(
+            bot,
+            handle_as_tasks=True,
+            tasks_concurrency_limit=Config.POLLING_MAX_PENDING,
+            close_bot_session=False,
+        )
+    finally:
+        await lifecycle.shutdown(bot)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+
+async def main():
+    await serve()
+
+
+def _worker(index: int):
+    logging.basicConfig(level=logging.INFO, format=f"[worker {index}] %(levelname)s:%(name)s:%(message)s")
+    asyncio.run(serve(prepare=False, set_webhook=False, reuse_port=True, worker=index))
+
+
+async def _prepare_once():
+    lifecycle = Lifecycle()
+    bot = Bot(token=Config.BOT_TOKEN)
+    try:
+        await asyncio.gather(lifecycle.prepare_database(), lifecycle.ensure_webhook(bot))
+    finally:
+        await bot.session.close()
+        db_executor.shutdown()
+
+
+async def repair_journal():
+    """Journal votes recorded in users but missing from votes (e.g. a worker crashed before a flush)."""
+    try:
+        added = await repository.journal_missing_votes()
+    finally:
+        db_executor.shutdown()
+    LOG.info("Added %d votes missing from the journal", added)
+
+
+def run_workers(count: int):
+    """N processes behind one webhook port (SO_REUSEPORT), sharing state through shared_store."""
+    if isinstance(shared_store, MemoryStore):
+        # each spawned worker would get an empty store of its own
+        raise ValueError(
+            f"WEBHOOK_WORKERS={count} needs a store shared between processes; "
+            "SHARED_STATE_BACKEND=memory lives in one process (use 'file')"
+        )
+    if shared_store is None:
+        LOG.warning(
+            "WEBHOOK_WORKERS=%d with SHARED_STATE_BACKEND=local: rate limits and caches are per worker",
+            count
+        )
+    asyncio.run(_prepare_once())
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_worker, args=(i,), name=f"webhook-worker-{i}") for i in range(count)]
+    for p in workers:
+        p.start()
+
+    def _terminate(signum, frame):
+        for p in workers:
+            if p.is_alive():
+                p.terminate()
+
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, _terminate)
+    for p in workers:
+        p.join()
 
-    while True:
-        await asyncio.sleep(3600)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="use long polling instead of the webhook (removes the registered webhook)"
+    )
+    parser.add_argument(
+        "--repair-journal",
+        action="store_true",
+        help="add votes missing from the vote journal and exit (safe while the bot runs)"
+    )
+    args = parser.parse_args()
+
     logging.basicConfig(level=logging.INFO)
-    asyncio.run(main())
\ No newline at end of file
+    if args.repair_journal:
+        asyncio.run(repair_journal())
+    elif args.polling:
+        asyncio.run(poll())
+    elif Config.WEBHOOK_WORKERS > 1:
+        run_workers(Config.WEBHOOK_WORKERS)
+    else:
+        asyncio.run(main())
@@ -0,0 +1,115 @@
+import time
+import logging
+from typing import Optional
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter, TelegramAPIError
+from aiohttp import web
+
+from config import Config
+
+from services import metrics, tasks
+from services.db_executor import db_executor
+from services.subscription_cache import subscription_cache
+from services.user_buffer import user_buffer
+
+LOG = logging.getLogger(__name__)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer dp.update middleware: total latency and DB work per update."""
+
+    async def __call__(self, handler, event, data):
+        stats = metrics.UpdateStats()
+        token = metrics.current_update.set(stats)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.update_seconds.observe(time.perf_counter() - started)
+            metrics.update_db_queries.observe(stats.db_queries)
+            metrics.update_db_seconds.observe(stats.db_seconds)
+            metrics.current_update.reset(token)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner dp.message middleware: latency per handler function. Callback
+    queries are timed per target handler by handlers.start_handler.route_callback.
+    """
+
+    async def __call__(self, handler, event, data):
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.handler_errors.inc(name)
+            raise
+        finally:
+            metrics.handler_seconds.observe(time.perf_counter() - started, name)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """bot.session request middleware: latency and errors per Bot API method."""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            metrics.api_retry_after.inc(name)
+            metrics.api_errors.inc(name, "retry_after")
+            raise
+        except TelegramAPIError as e:
+            metrics.api_errors.inc(name, type(e).__name__)
+            raise
+        except Exception as e:
+            metrics.api_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            metrics.api_seconds.observe(time.perf_counter() - started, name)
+
+
+def register_runtime_gauges():
+    metrics.registry.gauge("bot_db_executor_in_flight", "DB calls submitted and not finished.", lambda: db_executor.stats()["in_flight"])
+    metrics.registry.gauge("bot_db_executor_queue_depth", "DB calls waiting for a worker thread.", lambda: db_executor.queue_depth)
+    metrics.registry.counter_func("bot_subscription_cache_hits_total", "get_chat_member cache hits.", lambda: subscription_cache.hits)
+    metrics.registry.counter_func("bot_subscription_cache_misses_total", "get_chat_member cache misses.", lambda: subscription_cache.misses)
+    metrics.registry.gauge("bot_user_buffer_pending", "Users waiting for the next upsert flush.", lambda: user_buffer.stats()["pending"])
+    metrics.registry.gauge("bot_background_tasks", "Fire-and-forget tasks still running.", tasks.pending)
+
+
+register_runtime_gauges()
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=metrics.registry.render(), content_type="text/plain", charset="utf-8")
+
+
+def setup_metrics(dp, bot):
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_metrics = HandlerMetricsMiddleware()
+    dp.message.middleware(handler_metrics)
+    bot.session.middleware(ApiMetricsMiddleware())
+
+
+async def start_metrics_server(worker: int = 0) -> Optional[web.AppRunner]:
+    """
+    Serve /metrics on METRICS_HOST:METRICS_PORT + worker, a listener of its
+    own so the public webhook port never exposes it. Each worker process has
+    its own port (scrape them all and sum), so a counter never jumps between
+    workers' values. None if METRICS_PORT is None; the caller cleans up the
+    returned runner.
+    """
+    if Config.METRICS_PORT is None:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=Config.METRICS_HOST, port=Config.METRICS_PORT + worker).start()
+    return runner
@@ -1,14 +1,38 @@
+import time
+import datetime
+
 from peewee import *
+from playhouse.pool import PooledMySQLDatabase
 from config import Config
+from services.metrics import record_db_query
+
+class InstrumentedMySQLDatabase(PooledMySQLDatabase):
+    # statement count/latency for /metrics (per update as well, see services.metrics)
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().execute_sql(sql, params, *args, **kwargs)
+        finally:
+            record_db_query(time.perf_counter() - started)
 
-db = MySQLDatabase(
+# proxy so scripts (benchmarks/) can bind the models to another database
+db = DatabaseProxy()
+
+# one pooled connection per DB executor thread (see services/db_executor.py)
+db.initialize(InstrumentedMySQLDatabase(
     Config.mysql_db,
+    max_connections=Config.DB_POOL_SIZE,
+    stale_timeout=Config.DB_STALE_TIMEOUT,
     user=Config.mysql_user,
     password=Config.mysql_password,
     host=Config.mysql_host,
     port=Config.mysql_port,
     charset='utf8mb4'
-)
+))
+
+def conflict_target(*fields):
+    """on_conflict() target: MySQL's ON DUPLICATE KEY takes none, SQLite (benchmarks) requires one."""
+    return None if isinstance(db.obj, MySQLDatabase) else list(fields)
 
 class BaseModel(Model):
     class Meta:
@@ -25,6 +49,7 @@ class ConfidraMudiri(BaseModel):
         table_name = "confidra_mudiri"
         indexes = (
             (('facultet_type',), False),
+            (('full_name', 'facultet_type'), True),
         )
 
 class User(BaseModel):
@@ -45,4 +70,72 @@ class User(BaseModel):
         table_name = "users"
         indexes = (
             (('confedra_mudiri',), False),
-        )
\ No newline at end of file
+        )
+
+class CandidatePhoto(BaseModel):
+    # Telegram file_id of an uploaded portrait, valid while the file hash matches
+    candidate = ForeignKeyField(
+        ConfidraMudiri,
+        backref='photo_cache',
+        unique=True,
+        on_delete='CASCADE'
+    )
+    file_hash = CharField(max_length=64)
+    file_id = CharField(max_length=255)
+
+    class Meta:
+        table_name = "candidate_photos"
+
+class Broadcast(BaseModel):
+    # announcement sent to every user; last_user_id (users.id) is the resume checkpoint
+    text = TextField()
+    status = CharField(max_length=16, default="running")
+    total = IntegerField(default=0)
+    last_user_id = IntegerField(default=0)
+    sent = IntegerField(default=0)
+    failed = IntegerField(default=0)
+    blocked = IntegerField(default=0)
+    created_at = DateTimeField(default=datetime.datetime.now)
+    finished_at = DateTimeField(null=True)
+    # refreshed by the process sending it; a stale lease lets another process resume
+    heartbeat_at = DateTimeField(null=True)
+
+    class Meta:
+        table_name = "broadcasts"
+
+class BlockedUser(BaseModel):
+    # users that blocked the bot or deleted their account; skipped by broadcasts
+    telegram_id = BigIntegerField(unique=True)
+    reason = CharField(max_length=255)
+    marked_at = DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        table_name = "blocked_users"
+
+class Vote(BaseModel):
+    # append-only journal of accepted votes (users.confedra_mudiri stays the source of truth)
+    telegram_id = BigIntegerField(unique=True)
+    candidate_id = IntegerField()
+    # NULL for votes journaled after the fact (time unknown)
+    created_at = DateTimeField(default=datetime.datetime.now, null=True, index=True)
+
+    class Meta:
+        table_name = "votes"
+
+class VoteCheckpoint(BaseModel):
+    # per-candidate totals of votes.id <= vote_watermark.last_vote_id
+    candidate_id = IntegerField(primary_key=True)
+    votes = IntegerField()
+    # watermark when the row was written (vote_watermark is authoritative)
+    last_vote_id = IntegerField()
+
+    class Meta:
+        table_name = "vote_checkpoints"
+
+class VoteWatermark(BaseModel):
+    # single row: votes.id folded into vote_checkpoints; replay starts after it.
+    # Checkpoint writers lock it (SELECT ... FOR UPDATE) for the whole fold
+    last_vote_id = IntegerField()
+
+    class Meta:
+        table_name = "vote_watermark"
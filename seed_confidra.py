@@ -1,5 +1,31 @@
 # seed_confidra.py
-from models import db, ConfidraMudiri
+# Kafedra mudirlarini bazaga yozadi va portretlarini bog'laydi. Qayta ishga
+# tushirish xavfsiz: (full_name, facultet_type) bo'yicha upsert, faqat
+# o'zgarganlar yoziladi.
+#
+#   python seed_confidra.py [--dry-run] [--images "kafedra mudirlari"] [--out media/candidates]
+import os
+import re
+import argparse
+import unicodedata
+from difflib import SequenceMatcher
+from concurrent.futures import ProcessPoolExecutor
+
+from config import Config
+from models import db, conflict_target, ConfidraMudiri
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # portretlar o'zgartirilmasdan bog'lanadi
+    Image = None
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+# Telegram sends photos scaled to 1280px on the longest side anyway
+PHOTO_MAX_SIDE = 1280
+PHOTO_QUALITY = 87
+MATCH_THRESHOLD = 0.62
+UNIQUE_INDEX = "confidramudiri_full_name_facultet_type"
 
 FAKULTET_DATA = {
     1: [
@@ -32,13 +58,190 @@ FAKULTET_DATA = {
     ]
 }
 
-db.connect(reuse_if_open=True)
 
-for fac_id, names in FAKULTET_DATA.items():
-    for full_name in names:
-        ConfidraMudiri.create(
-            full_name=full_name,
-            facultet_type=fac_id
-        )
+_APOSTROPHES = "'‘’ʻʼ`´"
+# Uzbek Latin vs Russian-style spellings of the same name: Norqulova/Norkulova,
+# Shahnoza/Shaxnoza, Jurayev/Juraev, Radjab/Rajab
+_FOLD = (("kh", "x"), ("dj", "j"), ("q", "k"), ("h", "x"), ("yo", "e"),
+         ("iy", "i"), ("ay", "a"), ("ey", "e"), ("oy", "o"), ("uy", "u"))
+
+
+def name_tokens(name: str) -> list[str]:
+    name = unicodedata.normalize("NFKC", name).lower()
+    for ch in _APOSTROPHES:
+        name = name.replace(ch, "")
+    tokens = []
+    for token in re.findall(r"[a-z]+", name):
+        for old, new in _FOLD:
+            token = token.replace(old, new)
+        tokens.append(token)
+    return tokens
+
+
+def name_score(file_tokens: list[str], candidate_tokens: list[str]) -> float:
+    """Mean best similarity of each file-name token to the candidate's tokens (order-free)."""
+    if not file_tokens or not candidate_tokens:
+        return 0.0
+    return sum(
+        max(SequenceMatcher(None, ft, ct).ratio() for ct in candidate_tokens)
+        for ft in file_tokens
+    ) / len(file_tokens)
+
+
+def match_portraits(names: list[str], files: list[str]) -> dict[str, tuple[str, float]]:
+    """full_name -> (file, score); best pairs first, each file used once."""
+    file_tokens = {f: name_tokens(os.path.splitext(f)[0]) for f in files}
+    pairs = sorted(
+        ((name_score(ft, name_tokens(n)), n, f) for n in names for f, ft in file_tokens.items()),
+        reverse=True,
+    )
+    matched, used = {}, set()
+    for score, name, f in pairs:
+        if score < MATCH_THRESHOLD:
+            break
+        if name in matched or f in used:
+            continue
+        matched[name] = (f, score)
+        used.add(f)
+    return matched
+
+
+def optimize_photo(src: str, dst: str) -> str:
+    """Process pool worker: fit into PHOTO_MAX_SIDE and re-encode as JPEG. Returns dst."""
+    if os.path.exists(dst) and os.stat(dst).st_mtime >= os.stat(src).st_mtime:
+        return dst
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            background = Image.new("RGB", img.size, "white")
+            rgba = img.convert("RGBA")
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            img = background
+        img.thumbnail((PHOTO_MAX_SIDE, PHOTO_MAX_SIDE), Image.LANCZOS)
+        tmp = dst + ".tmp"
+        img.save(tmp, "JPEG", quality=PHOTO_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp, dst)
+    return dst
+
+
+def prepare_photos(matched: dict[str, tuple[str, float]], images_dir: str, out_dir: str, workers: int,
+                   dry_run: bool = False) -> dict[str, str]:
+    """full_name -> value for the image column (path relative to the project); dry_run writes no files."""
+    if Image is None:
+        print("Pillow o'rnatilmagan: portretlar o'zgartirilmasdan bog'lanadi.")
+        return {name: os.path.relpath(os.path.join(images_dir, f), PROJECT_DIR) for name, (f, _) in matched.items()}
+
+    jobs = {
+        name: (os.path.join(images_dir, f), os.path.join(out_dir, os.path.splitext(f)[0] + ".jpg"))
+        for name, (f, _) in matched.items()
+    }
+    if jobs and not dry_run:
+        os.makedirs(out_dir, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(optimize_photo, *zip(*jobs.values())))
+    return {name: os.path.relpath(dst, PROJECT_DIR) for name, (_, dst) in jobs.items()}
+
+
+def ensure_unique_index():
+    """The upsert key; tables created before it existed get it here."""
+    indexes = db.get_indexes(ConfidraMudiri._meta.table_name)
+    if any(i.unique and set(i.columns) == {"full_name", "facultet_type"} for i in indexes):
+        return
+    duplicates = (
+        ConfidraMudiri
+        .select(ConfidraMudiri.full_name, ConfidraMudiri.facultet_type)
+        .group_by(ConfidraMudiri.full_name, ConfidraMudiri.facultet_type)
+        .having(ConfidraMudiri.id.count() > 1)
+        .tuples()
+    )
+    duplicates = list(duplicates)
+    if duplicates:
+        lines = "\n".join(f"  {fid}: {name}" for name, fid in duplicates)
+        raise SystemExit(f"Takrorlangan nomzodlar bor, avval ularni birlashtiring:\n{lines}")
+    db.execute_sql(f"CREATE UNIQUE INDEX {UNIQUE_INDEX} ON {ConfidraMudiri._meta.table_name} (full_name, facultet_type)")
+
+
+def seed(images: dict[str, str], dry_run: bool) -> dict[str, list]:
+    """Upsert FAKULTET_DATA in one insert_many; returns what changed."""
+    report = {"added": [], "updated": [], "unchanged": [], "not_in_list": []}
+    with db.connection_context():
+        if not dry_run:
+            db.create_tables([ConfidraMudiri])
+            ensure_unique_index()
+        existing = {}
+        if ConfidraMudiri.table_exists():
+            existing = {
+                (name, fid): image
+                for name, image, fid in ConfidraMudiri
+                .select(ConfidraMudiri.full_name, ConfidraMudiri.image, ConfidraMudiri.facultet_type)
+                .tuples()
+            }
+        wanted = {(name, fid) for fid, names in FAKULTET_DATA.items() for name in names}
+
+        rows = []
+        for fid, names in FAKULTET_DATA.items():
+            for name in names:
+                key = (name, fid)
+                image = images.get(name)
+                if key not in existing:
+                    report["added"].append(key)
+                    rows.append({"full_name": name, "facultet_type": fid, "image": image or ""})
+                elif image and image != existing[key]:
+                    report["updated"].append(key)
+                    rows.append({"full_name": name, "facultet_type": fid, "image": image})
+                else:
+                    report["unchanged"].append(key)
+        report["not_in_list"] = sorted(set(existing) - wanted, key=lambda k: (k[1], k[0]))
+
+        if rows and not dry_run:
+            with db.atomic():
+                ConfidraMudiri.insert_many(rows).on_conflict(
+                    conflict_target=conflict_target(ConfidraMudiri.full_name, ConfidraMudiri.facultet_type),
+                    preserve=[ConfidraMudiri.image],
+                ).execute()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", default=os.path.join(PROJECT_DIR, "kafedra mudirlari"))
+    parser.add_argument("--out", default=os.path.join(PROJECT_DIR, "media", "candidates"))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="faqat hisobot, bazaga yozmaydi")
+    args = parser.parse_args()
+
+    names = [name for fac_names in FAKULTET_DATA.values() for name in fac_names]
+    files = sorted(f for f in os.listdir(args.images) if f.lower().endswith(IMAGE_EXTS)) if os.path.isdir(args.images) else []
+    matched = match_portraits(names, files)
+    images = prepare_photos(matched, args.images, args.out, args.workers, dry_run=args.dry_run)
+    report = seed(images, args.dry_run)
+
+    for label, key in (("Qo'shildi", "added"), ("Yangilandi", "updated")):
+        for name, fid in report[key]:
+            print(f"{label}: [{fid}] {name}")
+    for name, (f, score) in sorted(matched.items()):
+        if score < 1:
+            print(f"Taxminiy moslik ({score:.2f}): {name} <- {f}")
+    for name in names:
+        if name not in matched:
+            print(f"Portret topilmadi: {name}")
+    for f in sorted(set(files) - {f for f, _ in matched.values()}):
+        print(f"Ishlatilmagan fayl: {f}")
+    for name, fid in report["not_in_list"]:
+        print(f"Ro'yxatda yo'q (o'chirilmadi): [{fid}] {name}")
+    print(
+        f"Qo'shildi: {len(report['added'])}, yangilandi: {len(report['updated'])}, "
+        f"o'zgarmadi: {len(report['unchanged'])}" + (" (dry run)" if args.dry_run else "")
+    )
+
+    if (report["added"] or report["updated"]) and not args.dry_run:
+        if Config.CATALOG_WATCH_PATH:
+            with open(Config.CATALOG_WATCH_PATH, "a"):
+                os.utime(Config.CATALOG_WATCH_PATH)
+            print("Bot katalogni qayta yuklaydi.")
+        else:
+            print("Botda /reload_candidates yuboring yoki SIGHUP bering.")
+
 
-print("Seeder tugadi.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
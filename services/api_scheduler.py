@@ -0,0 +1,230 @@
+"""
+Outbound Bot API shaping, installed as a bot session request middleware:
+a global token bucket for new messages, per-chat buckets for everything that
+changes a chat, and automatic waiting on 429 retry_after.
+
+Callback answers are not queued at all: they have no message limit of their
+own and are useless once the user's spinner has timed out.
+"""
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import Config
+from services import metrics
+
+LOG = logging.getLogger(__name__)
+
+PRIORITY_NORMAL = 0
+PRIORITY_BULK = 1
+
+# priority for calls made from the current task; see bulk()
+api_priority: contextvars.ContextVar[int] = contextvars.ContextVar("api_priority", default=PRIORITY_NORMAL)
+
+# calls that count against the bot-wide message limit (~30 new messages/s)
+_GLOBAL_PREFIXES = ("Send", "Copy", "Forward")
+# calls limited per chat; edits and deletes answer a button press in the same chat
+_CHAT_PREFIXES = _GLOBAL_PREFIXES + ("Edit", "Delete")
+
+
+@contextmanager
+def bulk():
+    """Calls made inside the block queue behind interactive replies."""
+    token = api_priority.set(PRIORITY_BULK)
+    try:
+        yield
+    finally:
+        api_priority.reset(token)
+
+
+class _ChatBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class _GlobalBucket:
+    """
+    Token bucket shared by the whole bot. Waiters are served strictly by
+    priority, then arrival, by a single pump task.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self._rate = rate
+        self._capacity = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._pump_task: Optional[asyncio.Task] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self, priority: int):
+        self._refill()
+        if not self._waiters and self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump(), name="api-scheduler-pump")
+        await fut
+
+    def penalize(self, seconds: float):
+        """Telegram asked the whole bot to back off."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self._rate
+
+    async def _pump(self):
+        while self._waiters:
+            self._refill()
+            while self._waiters and self._tokens >= 1.0:
+                _, _, fut = heapq.heappop(self._waiters)
+                if fut.done():
+                    # caller gave up (cancelled) while queued
+                    continue
+                self._tokens -= 1.0
+                fut.set_result(None)
+            if self._waiters:
+                await asyncio.sleep((1.0 - self._tokens) / self._rate)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+
+class ApiScheduler(BaseRequestMiddleware):
+    """
+    Per-chat buckets reserve ahead (tokens may go negative, the caller sleeps
+    off the deficit), so one busy chat only delays itself; new messages take
+    the global bucket afterwards, in priority order. Edits and deletes are
+    limited per chat only, so a button press does not compete with broadcasts
+    for the global budget.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = Config.API_GLOBAL_RATE,
+        global_burst: int = Config.API_GLOBAL_BURST,
+        chat_rate: float = Config.API_PER_CHAT_RATE,
+        chat_burst: int = Config.API_PER_CHAT_BURST,
+        max_chats: int = Config.API_MAX_CHATS,
+        max_retries: int = Config.API_MAX_RETRIES,
+        max_retry_after: float = Config.API_MAX_RETRY_AFTER,
+        callback_deadline: float = Config.API_CALLBACK_DEADLINE_SECS,
+    ):
+        self._global = _GlobalBucket(global_rate, global_burst)
+        self._chat_rate = chat_rate
+        self._chat_capacity = float(chat_burst)
+        self._max_chats = max_chats
+        self._chats: dict[int, _ChatBucket] = {}
+        self._max_retries = max_retries
+        self._max_retry_after = max_retry_after
+        self._callback_deadline = callback_deadline
+
+    def _chat_bucket(self, chat_id: int, now: float) -> _ChatBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._max_chats:
+                self.sweep(now)
+            bucket = _ChatBucket(self._chat_capacity, now)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _reserve_chat(self, chat_id: int, penalty: float = 0.0) -> float:
+        """Take one token from the chat bucket; returns how long to wait for it."""
+        now = time.monotonic()
+        bucket = self._chat_bucket(chat_id, now)
+        bucket.tokens = min(self._chat_capacity, bucket.tokens + (now - bucket.updated) * self._chat_rate)
+        bucket.updated = now
+        if penalty:
+            bucket.tokens = min(bucket.tokens, 0.0) - penalty * self._chat_rate
+        bucket.tokens -= 1.0
+        if bucket.tokens >= 0.0:
+            return 0.0
+        return -bucket.tokens / self._chat_rate
+
+    def sweep(self, now: float = None) -> int:
+        """Drop chat buckets that have refilled completely; returns how many were removed."""
+        if now is None:
+            now = time.monotonic()
+        idle = [
+            chat_id for chat_id, b in self._chats.items()
+            if b.tokens + (now - b.updated) * self._chat_rate >= self._chat_capacity
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+        return len(idle)
+
+    async def _wait_turn(self, chat_id, is_global: bool, priority: int, penalty: float):
+        if chat_id is not None:
+            delay = self._reserve_chat(chat_id, penalty)
+            if delay:
+                await asyncio.sleep(delay)
+        if is_global:
+            await self._global.acquire(priority)
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        is_callback = name == "AnswerCallbackQuery"
+        is_global = name.startswith(_GLOBAL_PREFIXES)
+        chat_id = getattr(method, "chat_id", None) if name.startswith(_CHAT_PREFIXES) else None
+        if not isinstance(chat_id, int):
+            # @channel usernames and business chats are only limited globally
+            chat_id = None
+        shaped = is_global or chat_id is not None
+        priority = api_priority.get()
+
+        # a callback answer's deadline runs from when its update arrived
+        update = metrics.current_update.get()
+        started = update.started if update is not None else time.monotonic()
+        penalty = 0.0
+        attempt = 0
+        while True:
+            if shaped:
+                queued_at = time.monotonic()
+                await self._wait_turn(chat_id, is_global, priority, penalty)
+                metrics.api_queue_seconds.observe(time.monotonic() - queued_at, name)
+            elif penalty:
+                await asyncio.sleep(penalty)
+
+            if is_callback and time.monotonic() - started > self._callback_deadline:
+                # the spinner is gone; answering now only spends a request
+                LOG.debug("Dropped callback answer %.1fs after the update", time.monotonic() - started)
+                metrics.api_errors.inc(name, "deadline")
+                return True
+
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                waited = time.monotonic() - started
+                if (
+                    attempt > self._max_retries
+                    or e.retry_after > self._max_retry_after
+                    or (is_callback and waited + e.retry_after > self._callback_deadline)
+                ):
+                    raise
+                LOG.info("%s: retry after %ss (attempt %d)", name, e.retry_after, attempt)
+                metrics.api_retries.inc(name)
+                penalty = float(e.retry_after)
+                if is_global and chat_id is None:
+                    self._global.penalize(penalty)
+                    penalty = 0.0
+
+    def stats(self) -> dict:
+        return {"chats": len(self._chats), "queued": self._global.queued}
@@ -0,0 +1,211 @@
+"""
+Announcements to every registered user. Users are read in keyset pages of
+users.id; after each page the checkpoint and counters are saved, so a job
+interrupted by a crash or deploy is resumed by whichever process claims its
+lease next. Sends go through the bot session like any other call, at bulk
+priority (services/api_scheduler.py), so interactive replies stay ahead.
+"""
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from config import Config
+from services import repository
+from services.api_scheduler import bulk
+from services.user_buffer import user_buffer
+
+LOG = logging.getLogger(__name__)
+
+SENT = "sent"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+
+class _Run:
+    """Counters of the job this process is sending right now."""
+
+    def __init__(self, job):
+        self.job_id = job.id
+        self.total = job.total
+        self.last_user_id = job.last_user_id
+        self.counts = {SENT: job.sent, FAILED: job.failed, BLOCKED: job.blocked}
+        # counts as of the last saved checkpoint
+        self.saved = dict(self.counts)
+        self.started = time.monotonic()
+        self.done_at_start = sum(self.counts.values())
+
+    @property
+    def done(self) -> int:
+        return sum(self.counts.values())
+
+    def progress(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        rate = (self.done - self.done_at_start) / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - self.done)
+        return {
+            "job_id": self.job_id,
+            "total": self.total,
+            **self.counts,
+            "rate": rate,
+            "eta_secs": remaining / rate if rate else None,
+        }
+
+
+class Broadcaster:
+    """
+    Lifecycle service: start() begins watching for broadcasts to resume,
+    stop() interrupts the current one and releases its lease.
+    """
+
+    def __init__(self, batch_size: int, workers: int, lease_secs: float):
+        self._batch_size = batch_size
+        self._workers = workers
+        self._lease_secs = lease_secs
+        self._bot = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._job_task: Optional[asyncio.Task] = None
+        self.current: Optional[_Run] = None
+
+    def set_bot(self, bot):
+        self._bot = bot
+
+    @property
+    def busy(self) -> bool:
+        return self._job_task is not None and not self._job_task.done()
+
+    async def create(self, text: str) -> int:
+        """Start a new broadcast in this process; returns its id."""
+        job_id = await repository.create_broadcast(text)
+        self._launch(await repository.get_broadcast(job_id))
+        return job_id
+
+    def _launch(self, job):
+        self._job_task = asyncio.create_task(self._send_job(job), name=f"broadcast-{job.id}")
+
+    async def _send_one(self, telegram_id: int, text: str) -> tuple[str, Optional[str]]:
+        try:
+            await self._bot.send_message(chat_id=telegram_id, text=text, parse_mode="HTML")
+            return SENT, None
+        except TelegramForbiddenError as e:
+            # blocked by the user, or the account was deleted
+            return BLOCKED, e.message
+        except TelegramBadRequest as e:
+            if "chat not found" in e.message:
+                return BLOCKED, e.message
+            LOG.debug("Broadcast to %s failed: %s", telegram_id, e)
+            return FAILED, None
+        except Exception as e:
+            # includes retry_after beyond what the scheduler waits out
+            LOG.debug("Broadcast to %s failed: %s", telegram_id, e)
+            return FAILED, None
+
+    async def _send_batch(self, run: _Run, batch: list[tuple[int, int]], text: str):
+        queue = iter(batch)
+        blocked = []
+
+        async def worker():
+            for _, telegram_id in queue:
+                outcome, reason = await self._send_one(telegram_id, text)
+                run.counts[outcome] += 1
+                if outcome == BLOCKED:
+                    blocked.append((telegram_id, reason))
+
+        await asyncio.gather(*(worker() for _ in range(min(self._workers, len(batch)))))
+        await repository.mark_blocked(blocked)
+        for telegram_id, _ in blocked:
+            user_buffer.forget(telegram_id)
+
+    async def _save(self, run: _Run, status: str = "running", release: bool = False):
+        await repository.save_broadcast_progress(
+            run.job_id, run.last_user_id,
+            run.counts[SENT], run.counts[FAILED], run.counts[BLOCKED],
+            status=status, release=release,
+        )
+
+    async def _heartbeat(self, job_id: int):
+        # a page can take longer than the lease when the send rate is low
+        while True:
+            await asyncio.sleep(self._lease_secs / 3)
+            try:
+                await repository.touch_broadcast(job_id)
+            except Exception as e:
+                LOG.warning("Broadcast %d heartbeat failed: %s", job_id, e)
+
+    async def _send_job(self, job):
+        run = self.current = _Run(job)
+        LOG.info("Broadcast %d: starting after user %d (%d/%d done)", run.job_id, run.last_user_id, run.done, run.total)
+        heartbeat = asyncio.create_task(self._heartbeat(run.job_id))
+        try:
+            with bulk():
+                batch = await repository.broadcast_batch(run.last_user_id, self._batch_size)
+                while batch:
+                    # read the next page while this one is being sent
+                    next_batch = asyncio.create_task(
+                        repository.broadcast_batch(batch[-1][0], self._batch_size)
+                    )
+                    try:
+                        await self._send_batch(run, batch, job.text)
+                    except BaseException:
+                        next_batch.cancel()
+                        raise
+                    run.last_user_id = batch[-1][0]
+                    await self._save(run)
+                    run.saved = dict(run.counts)
+
+                    p = run.progress()
+                    eta = f"{p['eta_secs']:.0f}s" if p["eta_secs"] is not None else "?"
+                    LOG.info(
+                        "Broadcast %d: %d/%d (sent %d, blocked %d, failed %d), %.1f msg/s, ETA %s",
+                        run.job_id, run.done, run.total, p[SENT], p[BLOCKED], p[FAILED], p["rate"], eta
+                    )
+                    batch = await next_batch
+            await self._save(run, status="done", release=True)
+            LOG.info("Broadcast %d finished: %s", run.job_id, run.counts)
+        except asyncio.CancelledError:
+            # the page in progress is re-sent (and re-counted) by whoever resumes the job
+            run.counts = run.saved
+            await self._save(run, release=True)
+            raise
+        except Exception:
+            LOG.exception("Broadcast %d stopped, the lease will expire and it will be resumed", run.job_id)
+        finally:
+            heartbeat.cancel()
+            self.current = None
+
+    async def _watch(self):
+        while True:
+            if not self.busy:
+                try:
+                    job = await repository.claim_broadcast(self._lease_secs)
+                except Exception as e:
+                    job = None
+                    LOG.warning("Broadcast claim failed: %s", e)
+                if job is not None:
+                    self._launch(job)
+            await asyncio.sleep(self._lease_secs)
+
+    def start(self):
+        if self._bot is None:
+            raise RuntimeError("Broadcaster.set_bot() was not called")
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        for task in (self._watch_task, self._job_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._watch_task = self._job_task = None
+
+
+broadcaster = Broadcaster(
+    batch_size=Config.BROADCAST_BATCH_SIZE,
+    workers=Config.BROADCAST_WORKERS,
+    lease_secs=Config.BROADCAST_LEASE_SECS,
+)
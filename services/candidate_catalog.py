@@ -0,0 +1,172 @@
+import os
+import asyncio
+import logging
+from typing import Callable, Optional
+
+from config import Config
+from services import repository, tasks
+from services.shared_state import SharedStore, shared_store
+
+LOG = logging.getLogger(__name__)
+
+# button text limit used by the candidate keyboards
+LABEL_MAX = 18
+
+
+class Candidate:
+    __slots__ = ("id", "full_name", "image", "description", "facultet_type", "label")
+
+    def __init__(self, id: int, full_name: str, image: str, description: Optional[str], facultet_type: int):
+        self.id = id
+        self.full_name = full_name
+        self.image = image
+        self.description = description
+        self.facultet_type = facultet_type
+        self.label = full_name if len(full_name) <= LABEL_MAX else full_name[:LABEL_MAX - 3] + "..."
+
+    def _key(self) -> tuple:
+        return (self.id, self.full_name, self.image, self.description, self.facultet_type)
+
+
+class _Index:
+    __slots__ = ("by_id", "by_faculty")
+
+    def __init__(self, candidates: list[Candidate]):
+        self.by_id = {c.id: c for c in candidates}
+        by_faculty: dict[int, list[Candidate]] = {}
+        for c in sorted(candidates, key=lambda c: c.full_name):
+            by_faculty.setdefault(c.facultet_type, []).append(c)
+        self.by_faculty = {fid: tuple(rows) for fid, rows in by_faculty.items()}
+
+
+class CandidateCatalog:
+    """
+    All candidate rows, loaded once and indexed by id and by faculty (name
+    order). Every read of candidate data goes through here; the DB is read
+    again only on reload(): the /reload_candidates admin command, SIGHUP, or a
+    change of the watched trigger file. A reload builds a new index and swaps
+    it in one assignment, so readers see either the old or the new catalog.
+
+    With a shared store a reload in one worker bumps a shared epoch and the
+    other workers reload as well.
+    """
+
+    def __init__(self, watch_path: Optional[str], watch_secs: float, store: Optional[SharedStore] = None):
+        self._index = _Index([])
+        self._watch_path = watch_path
+        self._watch_secs = watch_secs
+        self._watch_mtime: Optional[float] = None
+        self._store = store
+        self._seen_epoch = 0
+        self._listeners: list[Callable[[], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._reload_lock = asyncio.Lock()
+
+        self.version = 0
+        self.loaded = False
+
+    def on_change(self, listener: Callable[[], None]):
+        """Call `listener` after every reload that changed the catalog."""
+        self._listeners.append(listener)
+
+    async def load(self) -> bool:
+        """(Re)read the candidates table; True if anything changed."""
+        async with self._reload_lock:
+            rows = await repository.candidate_rows()
+            candidates = [Candidate(*row) for row in rows]
+            old = self._index.by_id
+            changed = (
+                len(old) != len(candidates)
+                or any(c.id not in old or old[c.id]._key() != c._key() for c in candidates)
+            )
+            if changed:
+                self._index = _Index(candidates)
+                self.version += 1
+                for listener in self._listeners:
+                    listener()
+            self.loaded = True
+            return changed
+
+    async def reload(self) -> bool:
+        """load() here and, with a shared store, in every other worker."""
+        changed = await self.load()
+        if self._store is not None:
+            try:
+                self._seen_epoch = await self._store.incr("catalog:epoch")
+            except Exception as e:
+                LOG.warning("Failed to publish candidate reload: %s", e)
+        LOG.info("Candidate catalog reloaded (%d candidates, changed: %s)", len(self._index.by_id), changed)
+        return changed
+
+    def request_reload(self):
+        """Signal-handler friendly: schedule reload() on the running loop."""
+        tasks.spawn(self.reload(), name="catalog-reload")
+
+    def get(self, candidate_id: int) -> Optional[Candidate]:
+        return self._index.by_id.get(candidate_id)
+
+    def __contains__(self, candidate_id: int) -> bool:
+        return candidate_id in self._index.by_id
+
+    def __len__(self) -> int:
+        return len(self._index.by_id)
+
+    def all(self) -> list[Candidate]:
+        return list(self._index.by_id.values())
+
+    def faculty(self, fakultet_id: int) -> tuple[Candidate, ...]:
+        """Candidates of one faculty, ordered by name."""
+        return self._index.by_faculty.get(fakultet_id, ())
+
+    def _file_changed(self) -> bool:
+        try:
+            mtime = os.stat(self._watch_path).st_mtime
+        except OSError:
+            return False
+        if self._watch_mtime is None:
+            self._watch_mtime = mtime
+            return False
+        if mtime == self._watch_mtime:
+            return False
+        self._watch_mtime = mtime
+        return True
+
+    async def _shared_changed(self) -> bool:
+        epoch = int(await self._store.get("catalog:epoch") or 0)
+        if epoch == self._seen_epoch:
+            return False
+        self._seen_epoch = epoch
+        return True
+
+    async def _run(self):
+        if self._watch_path:
+            self._file_changed()
+        while True:
+            await asyncio.sleep(self._watch_secs)
+            try:
+                if self._watch_path and self._file_changed():
+                    await self.reload()
+                elif self._store is not None and await self._shared_changed():
+                    await self.load()
+            except Exception as e:
+                LOG.warning("Candidate catalog reload failed: %s", e)
+
+    def start(self):
+        if self._task is None and (self._watch_path or self._store is not None):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+candidate_catalog = CandidateCatalog(
+    watch_path=Config.CATALOG_WATCH_PATH,
+    watch_secs=Config.CATALOG_WATCH_SECS,
+    store=shared_store,
+)
@@ -0,0 +1,92 @@
+import time
+import asyncio
+import logging
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from models import db
+from config import Config
+
+LOG = logging.getLogger(__name__)
+
+
+class DBExecutor:
+    """
+    Runs blocking peewee calls on a bounded thread pool so the event loop keeps
+    serving other updates while MySQL answers. Each worker thread checks a
+    connection out of the pool for the duration of one call.
+    """
+
+    def __init__(self, max_workers: int, slow_secs: float):
+        self._max_workers = max_workers
+        self._slow_secs = slow_secs
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+        # submitted and not yet finished (queued + running)
+        self._in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.total_secs = 0.0   # submit -> result, including time spent queued
+        self.exec_secs = 0.0    # time spent inside the worker thread
+        self.max_secs = 0.0
+
+    @staticmethod
+    def _call(fn, args, kwargs):
+        started = time.monotonic()
+        with db.connection_context():
+            result = fn(*args, **kwargs)
+        return result, time.monotonic() - started
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        submitted = time.monotonic()
+        self._in_flight += 1
+        try:
+            # run in a copy of the caller's context so per-update metrics see the queries
+            ctx = contextvars.copy_context()
+            result, exec_secs = await loop.run_in_executor(
+                self._pool, functools.partial(ctx.run, self._call, fn, args, kwargs)
+            )
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._in_flight -= 1
+
+        elapsed = time.monotonic() - submitted
+        self.calls += 1
+        self.total_secs += elapsed
+        self.exec_secs += exec_secs
+        if elapsed > self.max_secs:
+            self.max_secs = elapsed
+        if elapsed >= self._slow_secs:
+            LOG.warning("Slow DB call %s: %.3fs (%.3fs executing)", getattr(fn, "__name__", fn), elapsed, exec_secs)
+        return result
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._in_flight - self._max_workers)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self._max_workers,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_secs": (self.total_secs / self.calls) if self.calls else 0.0,
+            "avg_exec_secs": (self.exec_secs / self.calls) if self.calls else 0.0,
+            "max_secs": self.max_secs,
+        }
+
+    def shutdown(self):
+        """Wait for running calls, then close the pooled connections they returned."""
+        self._pool.shutdown(wait=True)
+        # PooledMySQLDatabase keeps idle connections open; SQLite (benchmarks) has no pool
+        close_all = getattr(db.obj, "close_all", None)
+        if close_all is not None:
+            close_all()
+
+
+db_executor = DBExecutor(max_workers=Config.DB_POOL_SIZE, slow_secs=Config.DB_SLOW_QUERY_SECS)
@@ -0,0 +1,165 @@
+import os
+import csv
+import asyncio
+import logging
+import datetime
+import tempfile
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from config import Config
+from keyboards.inline_keyboards import FAKULTETLAR
+from services import repository, tasks
+from services.candidate_catalog import candidate_catalog
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # CSV only
+    Workbook = None
+
+LOG = logging.getLogger(__name__)
+
+KINDS = ("candidates", "faculties", "voters")
+
+
+class ExportFile(NamedTuple):
+    path: str
+    filename: str
+    rows: int
+
+
+class _CsvSheet:
+    def __init__(self, path: str, title: str):
+        # BOM so Excel opens the Uzbek names as UTF-8
+        self._file = open(path, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.writer(self._file)
+
+    def write(self, rows: list[tuple]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _XlsxSheet:
+    def __init__(self, path: str, title: str):
+        # write-only workbook: appended rows go to a temp file, not kept in memory
+        self._path = path
+        self._book = Workbook(write_only=True)
+        self._sheet = self._book.create_sheet(title)
+
+    def write(self, rows: list[tuple]):
+        for row in rows:
+            self._sheet.append(row)
+
+    def close(self):
+        self._book.save(self._path)
+
+
+SHEETS = {"csv": _CsvSheet}
+if Workbook is not None:
+    SHEETS["xlsx"] = _XlsxSheet
+
+
+class Exporter:
+    """
+    Writes results and voter lists to CSV/XLSX files for the /export admin
+    command. Rows are produced page by page (voters: keyset pages of
+    `page_size` through the DB executor) and each page is written in a thread
+    before the next is read, so memory does not grow with the number of
+    users. One export runs at a time, as a background task.
+    """
+
+    def __init__(self, page_size: int, export_dir: Optional[str]):
+        self._page_size = page_size
+        self._export_dir = export_dir
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def busy(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @staticmethod
+    def formats() -> tuple[str, ...]:
+        return tuple(SHEETS)
+
+    async def _candidate_pages(self):
+        counts = dict(await repository.candidate_tally())
+        yield [("candidate_id", "full_name", "facultet_id", "facultet", "votes")]
+        yield [
+            (c.id, c.full_name, c.facultet_type, FAKULTETLAR.get(c.facultet_type, ""), counts.get(c.id, 0))
+            for c in sorted(candidate_catalog.all(), key=lambda c: (c.facultet_type, -counts.get(c.id, 0), c.full_name))
+        ]
+
+    async def _faculty_pages(self):
+        counts = dict(await repository.candidate_tally())
+        totals = {fid: 0 for fid in FAKULTETLAR}
+        for c in candidate_catalog.all():
+            totals[c.facultet_type] = totals.get(c.facultet_type, 0) + counts.get(c.id, 0)
+        yield [("facultet_id", "facultet", "candidates", "votes")]
+        yield [
+            (fid, FAKULTETLAR.get(fid, ""), len(candidate_catalog.faculty(fid)), votes)
+            for fid, votes in sorted(totals.items())
+        ]
+
+    async def _voter_pages(self):
+        yield [("telegram_id", "first_name", "last_name", "lang", "candidate_id", "candidate", "facultet_id", "voted_at")]
+        after_id = 0
+        while True:
+            page = await repository.voter_page(after_id, self._page_size)
+            if not page:
+                return
+            after_id = page[-1][0]
+            rows = []
+            for _, telegram_id, first_name, last_name, lang, candidate_id, voted_at in page:
+                candidate = candidate_catalog.get(candidate_id)
+                rows.append((
+                    telegram_id, first_name or "", last_name or "", lang or "", candidate_id,
+                    candidate.full_name if candidate else "",
+                    candidate.facultet_type if candidate else "",
+                    voted_at.strftime("%Y-%m-%d %H:%M:%S") if voted_at else "",
+                ))
+            yield rows
+
+    async def export(self, kind: str, fmt: str) -> ExportFile:
+        """Write one export to a new file; the caller deletes it."""
+        pages = {"candidates": self._candidate_pages, "faculties": self._faculty_pages, "voters": self._voter_pages}[kind]
+        filename = f"{kind}_{datetime.datetime.now():%Y%m%d_%H%M%S}.{fmt}"
+        fd, path = tempfile.mkstemp(prefix="export_", suffix=f".{fmt}", dir=self._export_dir)
+        os.close(fd)
+        rows = -1  # header
+        try:
+            sheet = await asyncio.to_thread(SHEETS[fmt], path, kind)
+            try:
+                async for page in pages():
+                    await asyncio.to_thread(sheet.write, page)
+                    rows += len(page)
+            finally:
+                await asyncio.to_thread(sheet.close)
+        except BaseException:
+            os.remove(path)
+            raise
+        return ExportFile(path, filename, rows)
+
+    async def _run(self, kind: str, fmt: str, deliver: Callable[[ExportFile], Awaitable], fail: Callable[[Exception], Awaitable]):
+        try:
+            export = await self.export(kind, fmt)
+            try:
+                await deliver(export)
+            finally:
+                os.remove(export.path)
+        except Exception as e:
+            LOG.warning("Export of %s failed: %s", kind, e)
+            try:
+                await fail(e)
+            except Exception as e:
+                LOG.warning("Failed to report export error: %s", e)
+
+    def launch(self, kind: str, fmt: str, deliver: Callable[[ExportFile], Awaitable], fail: Callable[[Exception], Awaitable]) -> bool:
+        """Start an export in the background; False if one is already running."""
+        if self.busy:
+            return False
+        self._task = tasks.spawn(self._run(kind, fmt, deliver, fail), name=f"export-{kind}")
+        return True
+
+
+exporter = Exporter(page_size=Config.EXPORT_PAGE_SIZE, export_dir=Config.EXPORT_DIR)
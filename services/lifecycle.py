@@ -0,0 +1,129 @@
+import time
+import asyncio
+import logging
+
+from aiogram import Bot
+
+from config import Config
+from models import db, ConfidraMudiri, User, CandidatePhoto, Broadcast, BlockedUser, Vote, VoteCheckpoint, VoteWatermark
+from services import repository, tasks
+from services.candidate_catalog import candidate_catalog
+from services.db_executor import db_executor
+from services.photos import photo_store
+from services.vote_journal import vote_journal
+from services.vote_tally import vote_tally
+
+LOG = logging.getLogger(__name__)
+
+MODELS = [ConfidraMudiri, User, CandidatePhoto, Broadcast, BlockedUser, Vote, VoteCheckpoint, VoteWatermark]
+
+
+def _ensure_schema() -> list[str]:
+    # one SHOW TABLES instead of CREATE TABLE/INDEX IF NOT EXISTS for every model on every boot
+    existing = set(db.get_tables())
+    missing = [m for m in MODELS if m._meta.table_name not in existing]
+    if missing:
+        db.create_tables(missing)
+    return [m._meta.table_name for m in missing]
+
+
+class Lifecycle:
+    """
+    Startup/shutdown sequence for the bot process:
+
+    startup  - schema check and webhook registration (both skipped when nothing
+               changed), then cache warm-up in parallel, then background services
+    shutdown - stop taking updates, drain in-flight updates and background
+               tasks, stop services (flushing buffers), close DB pool and session
+    """
+
+    def __init__(self, drain_timeout: float = Config.SHUTDOWN_DRAIN_SECS):
+        self._drain_timeout = drain_timeout
+        self._boot_started = time.monotonic()
+        self._services = []
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.time_to_ready = None
+
+    async def track_updates(self, handler, event, data):
+        """Outer dp.update middleware: counts updates being processed."""
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._idle.set()
+
+    async def prepare_database(self):
+        created = await db_executor.run(_ensure_schema)
+        if created:
+            LOG.info("Created tables: %s", ", ".join(created))
+        # new journal: copy the votes already in users, before any worker writes to it.
+        # Votes lost from a crashed worker's buffer are re-added by main.py --repair-journal
+        if Vote._meta.table_name in created:
+            added = await repository.journal_missing_votes()
+            await repository.write_vote_checkpoint()
+            LOG.info("Vote journal initialised with %d existing votes", added)
+
+    async def ensure_webhook(self, bot: Bot):
+        info = await bot.get_webhook_info()
+        # Telegram doesn't report the secret token: change WEBHOOK_URL (e.g. the
+        # path) together with WEBHOOK_SECRET to force re-registration
+        if info.url == Config.WEBHOOK_URL:
+            LOG.info("Webhook already registered, skipping set_webhook")
+            return
+        await bot.set_webhook(
+            url=Config.WEBHOOK_URL,
+            secret_token=Config.WEBHOOK_SECRET
+        )
+
+    async def warm(self):
+        # the tally indexes faculties through the catalog
+        await candidate_catalog.load()
+        await asyncio.gather(
+            # checkpoint + journal tail instead of a users scan
+            vote_tally.load(from_journal=True),
+            vote_journal.load_series(),
+            photo_store.load(),
+        )
+
+    async def startup(self, bot: Bot, services=(), prepare: bool = True, set_webhook: bool = True):
+        """`services` expose start()/stop() (stop may be async); started in order, stopped in reverse."""
+        steps = []
+        if prepare:
+            steps.append(self.prepare_database())
+        if set_webhook:
+            steps.append(self.ensure_webhook(bot))
+        await asyncio.gather(*steps)
+        await self.warm()
+
+        for service in services:
+            service.start()
+            self._services.append(service)
+
+    def ready(self):
+        self.time_to_ready = time.monotonic() - self._boot_started
+        LOG.info("Ready to accept updates in %.2fs", self.time_to_ready)
+
+    async def drain(self):
+        """Wait for in-flight updates, then for background tasks they spawned."""
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=self._drain_timeout)
+        except asyncio.TimeoutError:
+            LOG.warning("%d updates still in flight after %.1fs", self._in_flight, self._drain_timeout)
+        remaining = max(0.0, self._drain_timeout - (time.monotonic() - started))
+        await tasks.drain(remaining)
+
+    async def shutdown(self, bot: Bot):
+        await self.drain()
+        for service in reversed(self._services):
+            result = service.stop()
+            if asyncio.iscoroutine(result):
+                await result
+        self._services.clear()
+        db_executor.shutdown()
+        await bot.session.close()
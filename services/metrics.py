@@ -0,0 +1,174 @@
+"""
+In-process metrics rendered in the Prometheus text format (served on
+/metrics at METRICS_HOST:METRICS_PORT, see metricsMiddleware).
+"""
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from typing import Callable, Optional
+
+# seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, values)} {total}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [0] * (len(self.buckets) + 1) + [0.0]
+                self._series[label_values] = series
+            series[idx] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help_text
+        self._read = read
+
+    def render(self) -> list[str]:
+        try:
+            value = float(self._read())
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", f"{self.name} {value}"]
+
+
+class CounterFunc(Gauge):
+    """Counter kept by another object (e.g. cache hits), read at scrape time."""
+
+    kind = "counter"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        metric = Gauge(name, help_text, read)
+        self._metrics.append(metric)
+        return metric
+
+    def counter_func(self, name: str, help_text: str, read: Callable[[], float]) -> CounterFunc:
+        metric = CounterFunc(name, help_text, read)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+update_seconds = registry.histogram("bot_update_seconds", "Time to process one update (all middlewares and handler).")
+handler_seconds = registry.histogram("bot_handler_seconds", "Handler latency.", labels=("handler",))
+handler_errors = registry.counter("bot_handler_errors_total", "Handlers that raised.", labels=("handler",))
+updates_deduplicated = registry.counter("bot_updates_deduplicated_total", "Redelivered updates dropped before processing.")
+update_db_queries = registry.histogram("bot_update_db_queries", "DB statements executed per update.", buckets=COUNT_BUCKETS)
+update_db_seconds = registry.histogram("bot_update_db_seconds", "DB time spent per update.")
+db_queries = registry.counter("bot_db_queries_total", "DB statements executed.")
+db_query_seconds = registry.histogram("bot_db_query_seconds", "DB statement latency.")
+api_seconds = registry.histogram("bot_api_request_seconds", "Telegram Bot API call latency.", labels=("method",))
+api_errors = registry.counter("bot_api_errors_total", "Failed Telegram Bot API calls.", labels=("method", "error"))
+api_retry_after = registry.counter("bot_api_retry_after_total", "429 Too Many Requests responses.", labels=("method",))
+api_queue_seconds = registry.histogram("bot_api_queue_seconds", "Time a Bot API call waited for rate-limit tokens.", labels=("method",))
+api_retries = registry.counter("bot_api_retries_total", "Bot API calls retried after retry_after.", labels=("method",))
+screen_transitions = registry.counter("bot_screen_transitions_total", "Screen changes by how they were made (skip, edit, resend).", labels=("transition",))
+
+
+class UpdateStats:
+    __slots__ = ("started", "db_queries", "db_seconds")
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+
+# set by the instrumentation middleware for the duration of one update;
+# services.db_executor copies the context into its worker threads
+current_update: contextvars.ContextVar[Optional[UpdateStats]] = contextvars.ContextVar("current_update", default=None)
+
+
+def record_db_query(seconds: float):
+    db_queries.inc()
+    db_query_seconds.observe(seconds)
+    stats = current_update.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += seconds
@@ -0,0 +1,127 @@
+import os
+import asyncio
+import hashlib
+import logging
+from typing import Optional
+
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+from aiogram.exceptions import TelegramBadRequest
+
+from services import repository
+
+LOG = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class PhotoStore:
+    """
+    Uploads each candidate portrait once and reuses Telegram's file_id afterwards.
+    A cached file_id is used only while the local file's sha256 still matches.
+    """
+
+    def __init__(self):
+        # candidate_id -> (file_hash, file_id)
+        self._file_ids: dict[int, tuple[str, str]] = {}
+        # path -> (mtime, size, sha256); the file is re-hashed only when its stat changes
+        self._hashes: dict[str, tuple[float, int, str]] = {}
+
+        self.uploads = 0
+        self.reuses = 0
+
+    async def load(self):
+        rows = await repository.candidate_photos()
+        self._file_ids = {cid: (file_hash, file_id) for cid, file_hash, file_id in rows}
+
+    @staticmethod
+    def local_path(image: Optional[str]) -> Optional[str]:
+        """Absolute path for a local portrait, None for URLs / Telegram file_ids / missing files."""
+        if not image or image.startswith(("http://", "https://")):
+            return None
+        path = image if os.path.isabs(image) else os.path.join(PROJECT_DIR, image)
+        return path if os.path.isfile(path) else None
+
+    def _file_hash(self, path: str) -> str:
+        st = os.stat(path)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._hashes[path] = (st.st_mtime, st.st_size, digest)
+        return digest
+
+    async def input_for(self, candidate_id: int, image: Optional[str]):
+        """
+        Returns (photo, file_hash). photo is a file_id/URL to send as-is, or an
+        FSInputFile to upload; file_hash is set only when an upload is needed.
+        """
+        path = self.local_path(image)
+        if path is None:
+            return image, None
+
+        file_hash = await asyncio.to_thread(self._file_hash, path)
+        cached = self._file_ids.get(candidate_id)
+        if cached and cached[0] == file_hash:
+            self.reuses += 1
+            return cached[1], None
+        return FSInputFile(path), file_hash
+
+    async def remember(self, candidate_id: int, file_hash: str, sent: Message):
+        file_id = sent.photo[-1].file_id
+        self._file_ids[candidate_id] = (file_hash, file_id)
+        self.uploads += 1
+        try:
+            await repository.save_candidate_photo(candidate_id, file_hash, file_id)
+        except Exception as e:
+            LOG.warning("Failed to store file_id for candidate %s: %s", candidate_id, e)
+
+    async def _with_photo(self, candidate_id: int, image: Optional[str], send) -> Message:
+        photo, file_hash = await self.input_for(candidate_id, image)
+        try:
+            sent = await send(photo)
+        except TelegramBadRequest:
+            if file_hash is not None or self.local_path(image) is None:
+                raise
+            # cached file_id rejected by Telegram -> forget it and upload again
+            LOG.info("Cached file_id for candidate %s rejected, re-uploading", candidate_id)
+            self._file_ids.pop(candidate_id, None)
+            photo, file_hash = await self.input_for(candidate_id, image)
+            sent = await send(photo)
+
+        if file_hash is not None:
+            await self.remember(candidate_id, file_hash, sent)
+        return sent
+
+    async def answer_photo(self, message: Message, candidate_id: int, image: Optional[str], **kwargs) -> Message:
+        return await self._with_photo(candidate_id, image, lambda photo: message.answer_photo(photo=photo, **kwargs))
+
+    async def edit_photo(self, message: Message, candidate_id: int, image: Optional[str], caption: str,
+                         parse_mode: Optional[str] = None, reply_markup=None) -> Message:
+        """Replace the photo and caption of a photo message in place (editMessageMedia)."""
+        return await self._with_photo(candidate_id, image, lambda photo: message.edit_media(
+            InputMediaPhoto(media=photo, caption=caption, parse_mode=parse_mode),
+            reply_markup=reply_markup,
+        ))
+
+    async def warm(self, bot, chat_id: int, candidates) -> int:
+        """Upload every portrait that has no valid file_id yet to `chat_id`."""
+        uploaded = 0
+        for c in candidates:
+            photo, file_hash = await self.input_for(c.id, c.image)
+            if file_hash is None:
+                continue
+            sent = await bot.send_photo(chat_id=chat_id, photo=photo, caption=c.full_name)
+            await self.remember(c.id, file_hash, sent)
+            uploaded += 1
+        return uploaded
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._file_ids),
+            "uploads": self.uploads,
+            "reuses": self.reuses,
+        }
+
+
+photo_store = PhotoStore()
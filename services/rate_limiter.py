@@ -0,0 +1,140 @@
+import sys
+import time
+from typing import NamedTuple
+
+from services.shared_state import SharedStore
+
+ALLOWED = "allowed"
+BLOCKED = "blocked"            # still inside an earlier block
+JUST_BLOCKED = "just_blocked"  # this request exceeded the limit
+
+
+class RateDecision(NamedTuple):
+    status: str
+    remaining: float = 0.0  # seconds left in the block
+
+
+_ALLOW = RateDecision(ALLOWED)
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "blocked_until")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.blocked_until = 0.0
+
+
+class InMemoryRateLimiter:
+    """
+    Per-user token bucket: `limit_count` requests per `window_secs`, refilled
+    continuously; running out blocks the user for `block_secs`.
+
+    hit() never awaits between reading and writing a bucket, so no lock is
+    needed and one user's state never waits on another's.
+    """
+
+    def __init__(self, limit_count: int, window_secs: float, block_secs: float, max_users: int = 100000):
+        self._capacity = float(limit_count)
+        self._refill_rate = limit_count / window_secs
+        self._block_secs = block_secs
+        self._max_users = max_users
+        self._buckets: dict[int, _Bucket] = {}
+        self.evicted = 0
+
+    def check(self, user_id: int, now: float) -> RateDecision:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self._max_users:
+                self._make_room(now)
+            bucket = _Bucket(self._capacity, now)
+            self._buckets[user_id] = bucket
+
+        if now < bucket.blocked_until:
+            return RateDecision(BLOCKED, bucket.blocked_until - now)
+
+        bucket.tokens = min(self._capacity, bucket.tokens + (now - bucket.updated) * self._refill_rate)
+        bucket.updated = now
+        bucket.tokens -= 1.0
+        if bucket.tokens <= 0.0:
+            bucket.blocked_until = now + self._block_secs
+            # start from a full bucket after the block, like clearing the history
+            bucket.tokens = self._capacity
+            return RateDecision(JUST_BLOCKED, self._block_secs)
+        return _ALLOW
+
+    async def hit(self, user_id: int) -> RateDecision:
+        return self.check(user_id, time.monotonic())
+
+    def _idle(self, bucket: _Bucket, now: float) -> bool:
+        # not blocked and refilled to the top -> same as having no entry at all
+        return (
+            now >= bucket.blocked_until
+            and bucket.tokens + (now - bucket.updated) * self._refill_rate >= self._capacity
+        )
+
+    def sweep(self, now: float = None) -> int:
+        """Drop buckets that carry no state any more; returns how many were removed."""
+        if now is None:
+            now = time.monotonic()
+        idle = [uid for uid, bucket in self._buckets.items() if self._idle(bucket, now)]
+        for uid in idle:
+            del self._buckets[uid]
+        return len(idle)
+
+    def _make_room(self, now: float):
+        batch = max(1, self._max_users // 100)
+        freed = self.sweep(now)
+        # still full of active users: forget the longest-tracked ones, a batch at a
+        # time so a flood of new users doesn't trigger a full sweep per request
+        while freed < batch and self._buckets:
+            del self._buckets[next(iter(self._buckets))]
+            self.evicted += 1
+            freed += 1
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        n = len(self._buckets)
+        per_entry = 0
+        if n:
+            sample = next(iter(self._buckets.values()))
+            # key int + bucket object + its three floats
+            per_entry = sys.getsizeof(0) + sys.getsizeof(sample) + 3 * sys.getsizeof(0.0)
+        return {
+            "users": n,
+            "blocked": sum(1 for b in self._buckets.values() if now < b.blocked_until),
+            "evicted": self.evicted,
+            "approx_bytes": sys.getsizeof(self._buckets) + n * per_entry,
+        }
+
+
+class SharedRateLimiter:
+    """
+    Fixed-window counter in a SharedStore, so all worker processes see the
+    same limits. Takes the same parameters as InMemoryRateLimiter but is not
+    a token bucket: the limit_count-th hit within one aligned window of
+    window_secs blocks, and the count restarts at each window boundary, so a
+    burst straddling a boundary gets through nearly twice as many hits.
+    """
+
+    def __init__(self, store: SharedStore, limit_count: int, window_secs: float, block_secs: float, prefix: str = "rl"):
+        self._store = store
+        self._limit_count = limit_count
+        self._window_secs = window_secs
+        self._block_secs = block_secs
+        self._prefix = prefix
+
+    async def hit(self, user_id: int) -> RateDecision:
+        now = time.time()
+        block_key = f"{self._prefix}:block:{user_id}"
+        blocked_until = await self._store.get(block_key)
+        if blocked_until is not None and now < float(blocked_until):
+            return RateDecision(BLOCKED, float(blocked_until) - now)
+
+        window = int(now // self._window_secs)
+        count = await self._store.incr(f"{self._prefix}:{user_id}:{window}", ttl=self._window_secs * 2)
+        if count >= self._limit_count:
+            await self._store.set(block_key, now + self._block_secs, ttl=self._block_secs)
+            return RateDecision(JUST_BLOCKED, self._block_secs)
+        return _ALLOW
@@ -0,0 +1,364 @@
+"""
+Async data access. Handlers await these functions instead of touching the
+models directly; the blocking peewee work runs on services.db_executor.
+"""
+import datetime
+from typing import Optional
+
+from peewee import fn, JOIN, Value
+
+from models import conflict_target, ConfidraMudiri, User, CandidatePhoto, Broadcast, BlockedUser, Vote, VoteCheckpoint, VoteWatermark, db
+from services.db_executor import db_executor
+
+
+def _upsert_users(rows: dict[int, tuple]) -> int:
+    data = [
+        {"telegram_id": tid, "first_name": first_name, "last_name": last_name, "lang": lang}
+        for tid, (first_name, last_name, lang) in rows.items()
+    ]
+    with db.atomic():
+        # one multi-row INSERT ... ON DUPLICATE KEY UPDATE
+        User.insert_many(data).on_conflict(
+            conflict_target=conflict_target(User.telegram_id),
+            preserve=[User.first_name, User.last_name, User.lang]
+        ).execute()
+        # writing to the bot again means the user has unblocked it
+        BlockedUser.delete().where(BlockedUser.telegram_id.in_(list(rows))).execute()
+    return len(data)
+
+
+def _candidate_rows() -> list[tuple[int, str, str, Optional[str], int]]:
+    return list(
+        ConfidraMudiri
+        .select(
+            ConfidraMudiri.id,
+            ConfidraMudiri.full_name,
+            ConfidraMudiri.image,
+            ConfidraMudiri.description,
+            ConfidraMudiri.facultet_type,
+        )
+        .order_by(ConfidraMudiri.id)
+        .tuples()
+    )
+
+
+def _candidate_photos() -> list[tuple[int, str, str]]:
+    return list(
+        CandidatePhoto
+        .select(CandidatePhoto.candidate, CandidatePhoto.file_hash, CandidatePhoto.file_id)
+        .tuples()
+    )
+
+
+def _save_candidate_photo(candidate_id: int, file_hash: str, file_id: str):
+    CandidatePhoto.replace(candidate=candidate_id, file_hash=file_hash, file_id=file_id).execute()
+
+
+def _record_vote(telegram_id: int, mudir_id: int) -> int:
+    # only a user who has not voted yet can be updated -> concurrent taps can't both win
+    return (
+        User
+        .update(confedra_mudiri=mudir_id)
+        .where((User.telegram_id == telegram_id) & User.confedra_mudiri.is_null())
+        .execute()
+    )
+
+
+def _cast_vote(telegram_id: int, mudir_id: int, defaults: dict) -> bool:
+    # usual case: the user row exists -> one conditional UPDATE
+    if _record_vote(telegram_id, mudir_id):
+        return True
+
+    # no row yet (user_buffer not flushed): insert it with the vote;
+    # telegram_id is unique, so this is a no-op if the row already exists
+    inserted = (
+        User
+        .insert(telegram_id=telegram_id, confedra_mudiri=mudir_id, **defaults)
+        .on_conflict_ignore()
+        .as_rowcount()
+        .execute()
+    )
+    if inserted:
+        return True
+
+    # the row appeared between the two statements -> it may still be unvoted
+    return bool(_record_vote(telegram_id, mudir_id))
+
+
+def _candidate_tally() -> list[tuple[int, int]]:
+    # names/faculties come from the candidate catalog; this is only the counts
+    q = (
+        User
+        .select(User.confedra_mudiri, fn.COUNT(User.id))
+        .where(User.confedra_mudiri.is_null(False))
+        .group_by(User.confedra_mudiri)
+        .tuples()
+    )
+    return list(q)
+
+
+def _append_votes(rows: list[tuple[int, int, datetime.datetime]]) -> int:
+    data = [
+        {"telegram_id": tid, "candidate_id": cid, "created_at": created_at}
+        for tid, cid, created_at in rows
+    ]
+    # telegram_id is unique: a row written twice (retried flush) is ignored
+    return Vote.insert_many(data).on_conflict_ignore().as_rowcount().execute()
+
+
+def _journal_missing_votes() -> int:
+    # votes recorded in users but not in the journal (table just created, or a
+    # crash before the journal buffer was flushed); their vote time is unknown
+    missing = (
+        User
+        .select(User.telegram_id, User.confedra_mudiri, Value(None))
+        .join(Vote, JOIN.LEFT_OUTER, on=(Vote.telegram_id == User.telegram_id))
+        .where(User.confedra_mudiri.is_null(False) & Vote.id.is_null())
+    )
+    return (
+        Vote
+        .insert_from(missing, [Vote.telegram_id, Vote.candidate_id, Vote.created_at])
+        .on_conflict_ignore()
+        .as_rowcount()
+        .execute()
+    )
+
+
+def _votes_after(last_vote_id: int, up_to: Optional[int] = None) -> dict[int, int]:
+    cond = Vote.id > last_vote_id
+    if up_to is not None:
+        cond &= Vote.id <= up_to
+    q = Vote.select(Vote.candidate_id, fn.COUNT(Vote.id)).where(cond).group_by(Vote.candidate_id).tuples()
+    return dict(q)
+
+
+def _watermark(lock: bool = False) -> int:
+    q = VoteWatermark.select(VoteWatermark.last_vote_id).where(VoteWatermark.id == 1)
+    # SQLite (benchmarks) has no FOR UPDATE; its write transactions are serialized anyway
+    if lock and db.obj.for_update:
+        q = q.for_update()
+    row = q.tuples().first()
+    if row is not None:
+        return row[0]
+    # checkpoints written before the watermark row existed carry it per candidate
+    legacy = VoteCheckpoint.select(fn.MAX(VoteCheckpoint.last_vote_id)).scalar() or 0
+    VoteWatermark.insert(id=1, last_vote_id=legacy).on_conflict_ignore().execute()
+    return _watermark(lock)
+
+
+def _checkpoint_counts() -> dict[int, int]:
+    return dict(VoteCheckpoint.select(VoteCheckpoint.candidate_id, VoteCheckpoint.votes).tuples())
+
+
+def _write_vote_checkpoint(up_to: Optional[int]) -> int:
+    with db.atomic():
+        # lock first: the reads below then see what an earlier writer committed,
+        # and a writer with an older up_to waits and finds nothing left to fold
+        last_vote_id = _watermark(lock=True)
+        newest = Vote.select(fn.MAX(Vote.id)).scalar() or 0
+        # ids below MAX(id) can still belong to uncommitted inserts of other
+        # workers; fold only up to a MAX(id) seen one checkpoint interval ago
+        up_to = newest if up_to is None else min(up_to, newest)
+        if up_to > last_vote_id:
+            counts = _checkpoint_counts()
+            for cid, votes in _votes_after(last_vote_id, up_to).items():
+                counts[cid] = counts.get(cid, 0) + votes
+            VoteCheckpoint.replace_many([
+                {"candidate_id": cid, "votes": votes, "last_vote_id": up_to}
+                for cid, votes in counts.items()
+            ]).execute()
+            VoteWatermark.update(last_vote_id=up_to).where(VoteWatermark.id == 1).execute()
+    return newest
+
+
+def _replay_votes() -> list[tuple[int, int]]:
+    # checkpoint + the journal tail after it: reads only the votes since the last checkpoint;
+    # one transaction so the watermark and the totals come from the same snapshot
+    with db.atomic():
+        last_vote_id = _watermark()
+        counts = _checkpoint_counts()
+        for cid, votes in _votes_after(last_vote_id).items():
+            counts[cid] = counts.get(cid, 0) + votes
+    return list(counts.items())
+
+
+def _vote_times(since: datetime.datetime) -> list[datetime.datetime]:
+    return [t for (t,) in Vote.select(Vote.created_at).where(Vote.created_at >= since).tuples()]
+
+
+def _reachable_users():
+    return (
+        User
+        .select(User.id, User.telegram_id)
+        .join(BlockedUser, JOIN.LEFT_OUTER, on=(BlockedUser.telegram_id == User.telegram_id))
+        .where(BlockedUser.id.is_null())
+    )
+
+
+def _broadcast_batch(after_id: int, limit: int) -> list[tuple[int, int]]:
+    # keyset pagination on the primary key: every batch is an index range scan
+    return list(
+        _reachable_users()
+        .where(User.id > after_id)
+        .order_by(User.id)
+        .limit(limit)
+        .tuples()
+    )
+
+
+def _voter_page(after_id: int, limit: int) -> list[tuple]:
+    # keyset page like _broadcast_batch; vote time from the journal (NULL if unknown)
+    return list(
+        User
+        .select(User.id, User.telegram_id, User.first_name, User.last_name, User.lang, User.confedra_mudiri, Vote.created_at)
+        .join(Vote, JOIN.LEFT_OUTER, on=(Vote.telegram_id == User.telegram_id))
+        .where((User.id > after_id) & User.confedra_mudiri.is_null(False))
+        .order_by(User.id)
+        .limit(limit)
+        .tuples()
+    )
+
+
+def _create_broadcast(text: str) -> int:
+    total = _reachable_users().count()
+    return Broadcast.insert(text=text, total=total, heartbeat_at=datetime.datetime.now()).execute()
+
+
+def _claim_broadcast(lease_secs: float) -> Optional[Broadcast]:
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=lease_secs)
+    stale = (Broadcast.status == "running") & (Broadcast.heartbeat_at.is_null() | (Broadcast.heartbeat_at < cutoff))
+    job = Broadcast.select().where(stale).order_by(Broadcast.id).first()
+    if job is None:
+        return None
+    # conditional UPDATE: only one process wins the lease
+    claimed = (
+        Broadcast
+        .update(heartbeat_at=datetime.datetime.now())
+        .where((Broadcast.id == job.id) & stale)
+        .execute()
+    )
+    return job if claimed else None
+
+
+def _save_broadcast_progress(job_id: int, last_user_id: int, sent: int, failed: int, blocked: int, status: str, release: bool):
+    now = datetime.datetime.now()
+    Broadcast.update(
+        last_user_id=last_user_id,
+        sent=sent,
+        failed=failed,
+        blocked=blocked,
+        status=status,
+        heartbeat_at=None if release else now,
+        finished_at=now if status != "running" else None,
+    ).where(Broadcast.id == job_id).execute()
+
+
+def _touch_broadcast(job_id: int):
+    Broadcast.update(heartbeat_at=datetime.datetime.now()).where(Broadcast.id == job_id).execute()
+
+
+def _mark_blocked(rows: list[tuple[int, str]]):
+    data = [{"telegram_id": tid, "reason": reason[:255]} for tid, reason in rows]
+    BlockedUser.insert_many(data).on_conflict_ignore().execute()
+
+
+def _get_broadcast(job_id: Optional[int]) -> Optional[Broadcast]:
+    if job_id is None:
+        return Broadcast.select().order_by(Broadcast.id.desc()).first()
+    return Broadcast.get_or_none(Broadcast.id == job_id)
+
+
+async def upsert_users(rows: dict[int, tuple]) -> int:
+    """rows: telegram_id -> (first_name, last_name, lang)"""
+    return await db_executor.run(_upsert_users, rows)
+
+
+async def candidate_rows() -> list[tuple[int, str, str, Optional[str], int]]:
+    """(id, full_name, image, description, facultet_type) of every candidate."""
+    return await db_executor.run(_candidate_rows)
+
+
+async def candidate_photos() -> list[tuple[int, str, str]]:
+    """(candidate_id, file_hash, file_id) for every uploaded portrait."""
+    return await db_executor.run(_candidate_photos)
+
+
+async def save_candidate_photo(candidate_id: int, file_hash: str, file_id: str):
+    await db_executor.run(_save_candidate_photo, candidate_id, file_hash, file_id)
+
+
+async def cast_vote(telegram_id: int, mudir_id: int, defaults: dict) -> bool:
+    """True if the vote was accepted, False if the user has already voted."""
+    return await db_executor.run(_cast_vote, telegram_id, mudir_id, defaults)
+
+
+async def candidate_tally() -> list[tuple[int, int]]:
+    """(candidate_id, votes) for every candidate with votes, one aggregate query."""
+    return await db_executor.run(_candidate_tally)
+
+
+async def broadcast_batch(after_id: int, limit: int) -> list[tuple[int, int]]:
+    """(users.id, telegram_id) of up to `limit` non-blocked users with id > after_id."""
+    return await db_executor.run(_broadcast_batch, after_id, limit)
+
+
+async def voter_page(after_id: int, limit: int) -> list[tuple]:
+    """(users.id, telegram_id, first_name, last_name, lang, candidate_id, voted_at) of up to `limit` voters with id > after_id."""
+    return await db_executor.run(_voter_page, after_id, limit)
+
+
+async def create_broadcast(text: str) -> int:
+    """New running broadcast, already leased by the caller."""
+    return await db_executor.run(_create_broadcast, text)
+
+
+async def claim_broadcast(lease_secs: float) -> Optional[Broadcast]:
+    """A running broadcast nobody has refreshed for `lease_secs`, now leased by the caller."""
+    return await db_executor.run(_claim_broadcast, lease_secs)
+
+
+async def save_broadcast_progress(job_id: int, last_user_id: int, sent: int, failed: int, blocked: int, status: str = "running", release: bool = False):
+    await db_executor.run(_save_broadcast_progress, job_id, last_user_id, sent, failed, blocked, status, release)
+
+
+async def touch_broadcast(job_id: int):
+    """Refresh the lease of a broadcast this process is sending."""
+    await db_executor.run(_touch_broadcast, job_id)
+
+
+async def mark_blocked(rows: list[tuple[int, str]]):
+    """rows: (telegram_id, reason)"""
+    if rows:
+        await db_executor.run(_mark_blocked, rows)
+
+
+async def get_broadcast(job_id: Optional[int] = None) -> Optional[Broadcast]:
+    """The given broadcast, or the latest one."""
+    return await db_executor.run(_get_broadcast, job_id)
+
+
+async def append_votes(rows: list[tuple[int, int, datetime.datetime]]) -> int:
+    """rows: (telegram_id, candidate_id, voted_at); one multi-row insert."""
+    return await db_executor.run(_append_votes, rows)
+
+
+async def journal_missing_votes() -> int:
+    return await db_executor.run(_journal_missing_votes)
+
+
+async def write_vote_checkpoint(up_to: Optional[int] = None) -> int:
+    """
+    Fold journal rows with id <= up_to into vote_checkpoints (None: all of
+    them - only safe with no other writers). Returns the current MAX(votes.id),
+    the `up_to` for the next checkpoint.
+    """
+    return await db_executor.run(_write_vote_checkpoint, up_to)
+
+
+async def replay_votes() -> list[tuple[int, int]]:
+    """(candidate_id, votes) rebuilt from the checkpoint and the journal tail."""
+    return await db_executor.run(_replay_votes)
+
+
+async def vote_times(since: datetime.datetime) -> list[datetime.datetime]:
+    return await db_executor.run(_vote_times, since)
@@ -0,0 +1,126 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from aiogram.types import Message
+from aiogram.exceptions import TelegramBadRequest
+
+from config import Config
+from services import metrics, tasks
+from services.photos import photo_store
+
+LOG = logging.getLogger(__name__)
+
+TEXT = "text"
+PHOTO = "photo"
+
+
+class Screen(NamedTuple):
+    message_id: int
+    kind: str  # TEXT or PHOTO
+    # what the message shows, e.g. ("fakultet", 2, <tally version>); None if unknown
+    name: Optional[tuple]
+
+
+class ScreenCache:
+    """
+    The bot message each user is looking at (LRU, TTL): its id, whether it
+    is a photo or text, and which screen it shows. show() uses it to move a
+    user to another screen with the fewest Bot API calls:
+
+        same screen             -> nothing
+        text  -> text           -> editMessageText
+        photo -> photo          -> editMessageMedia
+        photo -> text caption   -> editMessageCaption (keep_photo=True)
+        anything else           -> send the new message, delete the old one
+                                   in the background
+
+    Telegram cannot turn a text message into a photo or back, so those are the
+    only transitions that need two calls. Without an entry (restart, evicted,
+    a button on an older message) the kind is read from the pressed message.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        # user_id -> (screen, expires_at monotonic); order = least recently used first
+        self._entries: "OrderedDict[int, tuple[Screen, float]]" = OrderedDict()
+        self._ttl = ttl
+        self._max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, message_id: int) -> Optional[Screen]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0].message_id != message_id or time.monotonic() >= entry[1]:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, user_id: int, screen: Screen):
+        self._entries[user_id] = (screen, time.monotonic() + self._ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def remember(self, user_id: int, message: Message, name: tuple):
+        """Record a message the handler sent or edited itself."""
+        self.set(user_id, Screen(message.message_id, PHOTO if getattr(message, "photo", None) else TEXT, name))
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    async def _delete(message: Message):
+        try:
+            await message.delete()
+        except TelegramBadRequest as e:
+            # already deleted, or too old to delete
+            LOG.debug("Failed to delete screen message %s: %s", message.message_id, e)
+
+    async def show(self, message: Message, user_id: int, name: tuple, text: str, reply_markup=None,
+                   photo: Optional[tuple[int, str]] = None, keep_photo: bool = False):
+        """
+        Replace what `message` shows with screen `name`. photo: (candidate_id,
+        image) for a portrait screen; keep_photo: a text screen may stay on the
+        current photo as its caption.
+        """
+        current = self.get(user_id, message.message_id)
+        if current is None:
+            current = Screen(message.message_id, PHOTO if getattr(message, "photo", None) else TEXT, None)
+        if current.name == name:
+            metrics.screen_transitions.inc("skip")
+            return
+
+        try:
+            if photo is None and current.kind == TEXT:
+                await message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
+            elif photo is None and keep_photo:
+                await message.edit_caption(caption=text, parse_mode="HTML", reply_markup=reply_markup)
+            elif photo is not None and current.kind == PHOTO:
+                await photo_store.edit_photo(message, *photo, caption=text, parse_mode="HTML", reply_markup=reply_markup)
+            else:
+                await self._resend(message, user_id, name, text, reply_markup, photo)
+                return
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                LOG.debug("Edit of message %s failed, sending a new one: %s", message.message_id, e)
+                await self._resend(message, user_id, name, text, reply_markup, photo)
+                return
+        metrics.screen_transitions.inc("edit")
+        self.set(user_id, current._replace(name=name))
+
+    async def _resend(self, message: Message, user_id: int, name: tuple, text: str, reply_markup,
+                      photo: Optional[tuple[int, str]]):
+        if photo is not None:
+            sent = await photo_store.answer_photo(message, *photo, caption=text, parse_mode="HTML", reply_markup=reply_markup)
+        else:
+            sent = await message.answer(text, parse_mode="HTML", reply_markup=reply_markup)
+        metrics.screen_transitions.inc("resend")
+        self.remember(user_id, sent, name)
+        tasks.spawn(self._delete(message), name="screen-delete")
+
+
+screen_cache = ScreenCache(ttl=Config.SCREEN_CACHE_TTL_SECS, max_size=Config.SCREEN_CACHE_MAX_SIZE)
@@ -0,0 +1,178 @@
+import time
+import sqlite3
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from config import Config
+
+
+class SharedStore(ABC):
+    """
+    Minimal async key-value interface for state that has to be shared between
+    worker processes (rate limits, ...). Values are stored as strings.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Atomically add `amount`; `ttl` is applied only when the key is created."""
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    async def purge_expired(self) -> int:
+        """Drop expired keys; returns how many were removed."""
+        return 0
+
+
+class MemoryStore(SharedStore):
+    """In-process store: single-worker deployments and tests."""
+
+    def __init__(self):
+        # key -> (value, expires_at wall-clock or None)
+        self._data: dict[str, tuple[str, Optional[float]]] = {}
+
+    def _alive(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.time() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._alive(key)
+
+    async def set(self, key: str, value, ttl: Optional[float] = None):
+        self._data[key] = (str(value), time.time() + ttl if ttl else None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        current = self._alive(key)
+        if current is None:
+            value = amount
+            expires_at = time.time() + ttl if ttl else None
+        else:
+            value = int(current) + amount
+            expires_at = self._data[key][1]
+        self._data[key] = (str(value), expires_at)
+        return value
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def purge_expired(self) -> int:
+        expired = [key for key in list(self._data) if self._alive(key) is None]
+        return len(expired)
+
+
+class FileStore(SharedStore):
+    """
+    SQLite file shared by worker processes on one host. Every operation is a
+    short transaction run off the event loop.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str, ttl: Optional[float]):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl else None),
+        )
+
+    def _incr(self, key: str, amount: int, ttl: Optional[float]) -> int:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value, expires_at FROM kv WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                value = amount
+                expires_at = now + ttl if ttl else None
+            else:
+                value = int(row[0]) + amount
+                expires_at = row[1]
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, str(value), expires_at),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def _delete(self, key: str):
+        self._connect().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def _purge_expired(self) -> int:
+        return self._connect().execute(
+            "DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        ).rowcount
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value, ttl: Optional[float] = None):
+        await asyncio.to_thread(self._set, key, str(value), ttl)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return await asyncio.to_thread(self._incr, key, amount, ttl)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+    async def purge_expired(self) -> int:
+        return await asyncio.to_thread(self._purge_expired)
+
+
+def make_shared_store(backend: str = None) -> Optional[SharedStore]:
+    """Store selected by Config.SHARED_STATE_BACKEND; None means process-local state."""
+    backend = backend or Config.SHARED_STATE_BACKEND
+    if backend == "local":
+        return None
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "file":
+        return FileStore(Config.SHARED_STATE_PATH)
+    raise ValueError(f"Unknown SHARED_STATE_BACKEND: {backend!r}")
+
+
+shared_store = make_shared_store()
@@ -0,0 +1,89 @@
+import re
+import html
+import time
+import hashlib
+from typing import NamedTuple, Optional
+
+from config import Config
+from services.vote_journal import vote_journal
+from services.vote_tally import vote_tally
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPARK = "▁▂▃▄▅▆▇█"
+# minutes shown in the votes-per-minute line
+VELOCITY_MINUTES = 30
+
+
+class RenderedStats(NamedTuple):
+    version: tuple
+    rendered_at: float
+    html: str
+    digest: str  # sha1 of the text as Telegram will display it
+
+
+def content_digest(text: Optional[str]) -> str:
+    return hashlib.sha1((text or "").strip().encode("utf-8")).hexdigest()
+
+
+def sparkline(values: list[int]) -> str:
+    top = max(values, default=0)
+    if not top:
+        return _SPARK[0] * len(values)
+    return "".join(_SPARK[v * (len(_SPARK) - 1) // top] for v in values)
+
+
+class StatsSnapshot:
+    """
+    Pre-rendered statistics text shared by all viewers. A view is re-rendered
+    only when the tally changed and at most once per `min_interval` seconds;
+    the overall view also when the minute changes, since its votes-per-minute
+    line moves with the clock even when nobody votes.
+    """
+
+    def __init__(self, min_interval: float):
+        self._min_interval = min_interval
+        # fakultet_id (None = all candidates) -> RenderedStats
+        self._rendered: dict[Optional[int], RenderedStats] = {}
+
+    def _render(self, fakultet_id: Optional[int], title: str) -> str:
+        if fakultet_id is None:
+            rows = vote_tally.ranking()
+        else:
+            rows = sorted(vote_tally.faculty(fakultet_id), key=lambda r: (-r[2], r[1]))
+
+        lines = [f"📊 <b>{html.escape(title)}</b>\n"]
+        rank = 1
+        for _, full_name, count in rows:
+            lines.append(f"{rank}. {html.escape(full_name)} — <b>{count}</b> ta")
+            rank += 1
+
+        if fakultet_id is None:
+            per_minute = vote_journal.series(VELOCITY_MINUTES)
+            lines.append(
+                f"\n⏱ So'nggi {VELOCITY_MINUTES} daqiqa: <b>{sum(per_minute)}</b> ta ovoz\n"
+                f"{sparkline(per_minute)}"
+            )
+        return "\n".join(lines)
+
+    def get(self, fakultet_id: Optional[int] = None, title: str = "Ovozlar Statistikasi") -> RenderedStats:
+        if fakultet_id is None:
+            version = (vote_tally.version, int(time.time()) // 60)
+        else:
+            version = (vote_tally.faculty_version(fakultet_id),)
+
+        now = time.monotonic()
+        cached = self._rendered.get(fakultet_id)
+        if cached and (cached.version == version or now - cached.rendered_at < self._min_interval):
+            return cached
+
+        text = self._render(fakultet_id, title)
+        plain = html.unescape(_TAG_RE.sub("", text))
+        snapshot = RenderedStats(version, now, text, content_digest(plain))
+        self._rendered[fakultet_id] = snapshot
+        return snapshot
+
+    def invalidate(self):
+        self._rendered.clear()
+
+
+stats_snapshot = StatsSnapshot(min_interval=Config.STATS_MIN_INTERVAL_SECS)
@@ -0,0 +1,113 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from aiogram.exceptions import TelegramBadRequest
+
+from config import Config
+from services.shared_state import SharedStore, shared_store
+
+LOG = logging.getLogger(__name__)
+
+SUBSCRIBED_STATUSES = ("creator", "administrator", "member", "restricted")
+
+
+class SubscriptionCache:
+    """
+    Per-user channel membership cache (LRU, separate TTL for members and non-members).
+    """
+
+    def __init__(self, positive_ttl: float, negative_ttl: float, max_size: int, store: Optional[SharedStore] = None):
+        # user_id -> (is_member, expires_at monotonic); order = least recently used first
+        self._entries: "OrderedDict[int, tuple[bool, float]]" = OrderedDict()
+        self._positive_ttl = positive_ttl
+        self._negative_ttl = negative_ttl
+        self._max_size = max_size
+        # optional second level shared with the other worker processes
+        self._store = store
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: int) -> Optional[bool]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        is_member, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return is_member
+
+    def set(self, user_id: int, is_member: bool):
+        ttl = self._positive_ttl if is_member else self._negative_ttl
+        self._entries[user_id] = (is_member, time.monotonic() + ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits / total) if total else 0.0,
+        }
+
+    async def is_subscribed(self, bot, user_id: int, force: bool = False) -> Optional[bool]:
+        """
+        True/False from cache or Telegram. None if Telegram could not answer
+        (unexpected error) - such results are not cached.
+        """
+        key = f"sub:{user_id}"
+        if force:
+            self.invalidate(user_id)
+        else:
+            cached = self.get(user_id)
+            if cached is not None:
+                return cached
+            if self._store is not None:
+                shared = await self._store.get(key)
+                if shared is not None:
+                    # another worker asked Telegram recently
+                    is_member = shared == "1"
+                    self.set(user_id, is_member)
+                    return is_member
+
+        try:
+            member = await bot.get_chat_member(chat_id=Config.CHANNEL_ID, user_id=user_id)
+            is_member = member.status in SUBSCRIBED_STATUSES
+        except TelegramBadRequest:
+            # user is not a member or Telegram returned 400-series error -> treat as not subscribed
+            is_member = False
+        except Exception as e:
+            LOG.debug("Error while checking chat member for user %s: %s", user_id, e)
+            return None
+
+        self.set(user_id, is_member)
+        if self._store is not None:
+            ttl = self._positive_ttl if is_member else self._negative_ttl
+            await self._store.set(key, "1" if is_member else "0", ttl=ttl)
+        return is_member
+
+
+subscription_cache = SubscriptionCache(
+    positive_ttl=Config.SUB_CACHE_POSITIVE_TTL,
+    negative_ttl=Config.SUB_CACHE_NEGATIVE_TTL,
+    max_size=Config.SUB_CACHE_MAX_SIZE,
+    store=shared_store,
+)
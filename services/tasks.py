@@ -0,0 +1,35 @@
+"""
+Registry for fire-and-forget background tasks (auto-delete messages, shared
+store publishes, ...) so shutdown can wait for them instead of dropping them.
+"""
+import asyncio
+import logging
+from typing import Coroutine, Optional
+
+LOG = logging.getLogger(__name__)
+
+_tasks: set[asyncio.Task] = set()
+
+
+def spawn(coro: Coroutine, name: Optional[str] = None) -> asyncio.Task:
+    task = asyncio.create_task(coro, name=name)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+def pending() -> int:
+    return len(_tasks)
+
+
+async def drain(timeout: float) -> int:
+    """Wait up to `timeout` seconds for registered tasks; cancel the rest. Returns how many were cancelled."""
+    if not _tasks:
+        return 0
+    _, still_running = await asyncio.wait(set(_tasks), timeout=timeout)
+    for task in still_running:
+        task.cancel()
+    if still_running:
+        LOG.warning("Cancelled %d background tasks still running after %.1fs", len(still_running), timeout)
+        await asyncio.gather(*still_running, return_exceptions=True)
+    return len(still_running)
@@ -0,0 +1,87 @@
+import time
+import logging
+from typing import Optional
+
+from config import Config
+from services import metrics
+from services.shared_state import SharedStore, shared_store
+
+LOG = logging.getLogger(__name__)
+
+
+class RecentIds:
+    """
+    Fixed-size window of recently seen ids: a ring buffer (arrival order, for
+    expiry and eviction) plus a set (membership). Every operation is O(1)
+    amortized and memory never grows past `capacity` entries.
+    """
+
+    def __init__(self, capacity: int, ttl: float):
+        self._capacity = capacity
+        self._ttl = ttl
+        self._ids = [0] * capacity
+        self._times = [0.0] * capacity
+        self._oldest = 0
+        self._size = 0
+        self._members: set[int] = set()
+
+    def _drop_oldest(self):
+        self._members.discard(self._ids[self._oldest])
+        self._oldest = (self._oldest + 1) % self._capacity
+        self._size -= 1
+
+    def add(self, item: int, now: float) -> bool:
+        """Record `item`; False if it was already in the window."""
+        while self._size and self._times[self._oldest] <= now - self._ttl:
+            self._drop_oldest()
+        if item in self._members:
+            return False
+        if self._size == self._capacity:
+            self._drop_oldest()
+
+        slot = (self._oldest + self._size) % self._capacity
+        self._ids[slot] = item
+        self._times[slot] = now
+        self._size += 1
+        self._members.add(item)
+        return True
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class UpdateDeduplicator:
+    """
+    First outer dp.update middleware: drops an update whose update_id was seen
+    recently (Telegram redelivers webhooks it considers unanswered). With a
+    shared store, ids seen by the other worker processes count as well.
+    """
+
+    def __init__(self, capacity: int, ttl: float, store: Optional[SharedStore] = None):
+        self._recent = RecentIds(capacity, ttl)
+        self._ttl = ttl
+        self._store = store
+        self.duplicates = 0
+
+    async def is_duplicate(self, update_id: int) -> bool:
+        if not self._recent.add(update_id, time.monotonic()):
+            return True
+        if self._store is not None:
+            # the retry may have been delivered to another worker first
+            return await self._store.incr(f"upd:{update_id}", ttl=self._ttl) > 1
+        return False
+
+    async def __call__(self, handler, event, data):
+        if await self.is_duplicate(event.update_id):
+            self.duplicates += 1
+            metrics.updates_deduplicated.inc()
+            LOG.debug("Dropping redelivered update %s", event.update_id)
+            return None
+        return await handler(event, data)
+
+
+update_dedup = UpdateDeduplicator(
+    capacity=Config.UPDATE_DEDUP_SIZE,
+    ttl=Config.UPDATE_DEDUP_TTL_SECS,
+    store=shared_store,
+)
@@ -0,0 +1,43 @@
+import asyncio
+
+
+class UpdateScheduler:
+    """
+    Outer dp.update middleware for concurrent update processing: at most
+    `max_in_flight` updates run at once, and updates from the same user run
+    one at a time in arrival order. A user's queued updates wait on that
+    user's lock before taking a slot, so they never hold slots other users
+    could use.
+    """
+
+    def __init__(self, max_in_flight: int):
+        self._slots = asyncio.Semaphore(max_in_flight)
+        # user_id -> [lock, number of updates holding or waiting for it]
+        self._user_locks: dict[int, list] = {}
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            async with self._slots:
+                return await handler(event, data)
+
+        entry = self._user_locks.get(user.id)
+        if entry is None:
+            entry = [asyncio.Lock(), 0]
+            self._user_locks[user.id] = entry
+        entry[1] += 1
+        try:
+            # asyncio.Lock wakes waiters FIFO -> per-user arrival order is kept
+            async with entry[0]:
+                async with self._slots:
+                    return await handler(event, data)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._user_locks[user.id]
+
+    def stats(self) -> dict:
+        return {
+            "users_queued": len(self._user_locks),
+            "waiting": sum(e[1] for e in self._user_locks.values()),
+        }
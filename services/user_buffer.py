@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from typing import Optional
+
+from config import Config
+from services import repository
+
+LOG = logging.getLogger(__name__)
+
+
+class UserUpsertBuffer:
+    """
+    Write-behind replacement for per-update User.get_or_create.
+
+    touch() is synchronous and costs nothing for users already written with the
+    same name/lang; new or changed users are batched and written by a background
+    task with one multi-row upsert every `flush_interval` seconds or as soon as
+    `max_batch` rows are pending.
+    """
+
+    def __init__(self, flush_interval: float, max_batch: int, max_known: int):
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._max_known = max_known
+
+        # telegram_id -> (first_name, last_name, lang) as last written to DB
+        self._known: dict[int, tuple] = {}
+        # telegram_id -> (first_name, last_name, lang) waiting for the next flush
+        self._pending: dict[int, tuple] = {}
+
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+
+    def touch(self, telegram_id: int, first_name: Optional[str], last_name: Optional[str], lang: Optional[str]):
+        row = (first_name, last_name, lang or "uz")
+        if self._known.get(telegram_id) == row or self._pending.get(telegram_id) == row:
+            return
+        self._pending[telegram_id] = row
+        if len(self._pending) >= self._max_batch:
+            self._wakeup.set()
+
+    def forget(self, telegram_id: int):
+        """Write the user again on the next touch() (e.g. to clear a blocked mark)."""
+        self._known.pop(telegram_id, None)
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._pending:
+                batch = {}
+                for tid in list(self._pending)[:self._max_batch]:
+                    batch[tid] = self._pending.pop(tid)
+                try:
+                    await repository.upsert_users(batch)
+                except Exception as e:
+                    self.failed_flushes += 1
+                    LOG.warning("User upsert of %d rows failed, will retry: %s", len(batch), e)
+                    # keep newer values if the user was touched again meanwhile
+                    for tid, row in batch.items():
+                        self._pending.setdefault(tid, row)
+                    return
+
+                self.flushes += 1
+                self.flushed_rows += len(batch)
+                self._known.update(batch)
+                # forget the oldest entries; they only cost one more upsert if seen again
+                while len(self._known) > self._max_known:
+                    del self._known[next(iter(self._known))]
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "known": len(self._known),
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+user_buffer = UserUpsertBuffer(
+    flush_interval=Config.USER_FLUSH_INTERVAL_MS / 1000,
+    max_batch=Config.USER_FLUSH_MAX_ROWS,
+    max_known=Config.USER_KNOWN_MAX,
+)
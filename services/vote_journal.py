@@ -0,0 +1,137 @@
+import time
+import asyncio
+import datetime
+import logging
+from typing import Optional
+
+from config import Config
+from services import repository
+
+LOG = logging.getLogger(__name__)
+
+
+class VoteJournal:
+    """
+    Append-only log of accepted votes in the `votes` table.
+
+    record() is synchronous; entries are written in multi-row inserts every
+    `flush_interval` seconds (or once `max_batch` are pending), and every
+    `checkpoint_secs` the journal is folded into per-candidate totals so a
+    restart replays only the votes since the last checkpoint. A checkpoint
+    folds only ids that already existed at the previous one, so inserts other
+    workers had in flight then have committed by now.
+
+    Also keeps a votes-per-minute window for the stats screen: reloaded from
+    the journal at each checkpoint (votes of every worker), local votes added
+    in between.
+    """
+
+    def __init__(self, flush_interval: float, max_batch: int, checkpoint_secs: float, series_minutes: int):
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._checkpoint_secs = checkpoint_secs
+        self._series_minutes = series_minutes
+
+        self._pending: list[tuple[int, int, datetime.datetime]] = []
+        # minute (unix time // 60) -> votes
+        self._per_minute: dict[int, int] = {}
+
+        # MAX(votes.id) seen by the previous checkpoint; folded by the next one
+        self._checkpoint_up_to = 0
+
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+
+    def record(self, telegram_id: int, candidate_id: int):
+        now = datetime.datetime.now()
+        self._pending.append((telegram_id, candidate_id, now))
+        minute = int(now.timestamp()) // 60
+        self._per_minute[minute] = self._per_minute.get(minute, 0) + 1
+        if len(self._pending) >= self._max_batch:
+            self._wakeup.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self._max_batch]
+                try:
+                    await repository.append_votes(batch)
+                except Exception as e:
+                    self.failed_flushes += 1
+                    LOG.warning("Vote journal write of %d rows failed, will retry: %s", len(batch), e)
+                    return
+                del self._pending[:len(batch)]
+                self.flushed_rows += len(batch)
+
+    async def checkpoint(self):
+        await self.flush()
+        self._checkpoint_up_to = await repository.write_vote_checkpoint(self._checkpoint_up_to)
+        await self.load_series()
+
+    async def load_series(self):
+        since = datetime.datetime.now() - datetime.timedelta(minutes=self._series_minutes)
+        per_minute: dict[int, int] = {}
+        for voted_at in await repository.vote_times(since):
+            minute = int(voted_at.timestamp()) // 60
+            per_minute[minute] = per_minute.get(minute, 0) + 1
+        # votes recorded here but not written yet
+        for _, _, voted_at in self._pending:
+            minute = int(voted_at.timestamp()) // 60
+            per_minute[minute] = per_minute.get(minute, 0) + 1
+        self._per_minute = per_minute
+
+    def series(self, minutes: Optional[int] = None) -> list[int]:
+        """Votes per minute, oldest first; the last element is the current minute."""
+        minutes = minutes or self._series_minutes
+        current = int(time.time()) // 60
+        return [self._per_minute.get(m, 0) for m in range(current - minutes + 1, current + 1)]
+
+    async def _run(self):
+        last_checkpoint = time.monotonic()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                if time.monotonic() - last_checkpoint >= self._checkpoint_secs:
+                    last_checkpoint = time.monotonic()
+                    await self.checkpoint()
+                else:
+                    await self.flush()
+            except Exception as e:
+                LOG.warning("Vote journal checkpoint failed: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+vote_journal = VoteJournal(
+    flush_interval=Config.VOTE_JOURNAL_FLUSH_MS / 1000,
+    max_batch=Config.VOTE_JOURNAL_MAX_ROWS,
+    checkpoint_secs=Config.VOTE_CHECKPOINT_SECS,
+    series_minutes=Config.VOTE_SERIES_MINUTES,
+)
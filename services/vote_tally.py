@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from typing import Optional
+
+from config import Config
+from services import repository, tasks
+from services.candidate_catalog import candidate_catalog
+from services.shared_state import SharedStore, shared_store
+
+LOG = logging.getLogger(__name__)
+
+
+class VoteTally:
+    """
+    Process-wide candidate_id -> votes map. Loaded once from one aggregate query,
+    bumped by vote_handler and periodically reconciled with the DB (which also
+    picks up votes cast by other processes). Stats and keyboards read only this;
+    names and faculties come from the candidate catalog.
+
+    With a shared store every accepted vote also bumps a per-candidate shared
+    counter and a shared epoch. Workers poll the epoch every `sync_secs`; when
+    it moved they read the counters and add what they have not counted yet
+    (their own votes are counted at increment time), so a sync costs a few
+    store reads instead of the aggregate query.
+    """
+
+    def __init__(self, reconcile_secs: float, store: Optional[SharedStore] = None, sync_secs: float = 1.0):
+        self._reconcile_secs = reconcile_secs
+        self._store = store
+        self._sync_secs = sync_secs
+        # last shared epoch seen by _sync
+        self._seen_epoch = 0
+        # candidate_id -> value of its shared counter already included in _counts
+        self._applied: dict[int, int] = {}
+        self._sync_task: Optional[asyncio.Task] = None
+        self._counts: dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        # bumped on every change so renderers can cache by version
+        self.version = 0
+        # fakultet_id -> version of that faculty's counts
+        self._faculty_versions: dict[int, int] = {}
+        self.loaded = False
+
+    async def load(self, from_journal: bool = False):
+        if from_journal:
+            counts = dict(await repository.replay_votes())
+        else:
+            counts = dict(await repository.candidate_tally())
+        if self._store is not None:
+            # the DB already has the votes counted so far; deltas start from here
+            try:
+                self._seen_epoch = await self._read_epoch()
+                self._applied = await self._read_counters()
+            except Exception as e:
+                LOG.warning("Failed to read shared vote counters: %s", e)
+        if counts != self._counts:
+            # swap the whole dict: readers never see a half-built tally
+            self._counts = counts
+            self._bump_all()
+        self.loaded = True
+
+    def _bump_all(self):
+        self.version += 1
+        # any faculty may have changed; a global version keeps them all distinct
+        self._faculty_versions = {c.facultet_type: self.version for c in candidate_catalog.all()}
+
+    def catalog_changed(self):
+        # names/faculties changed: cached keyboards and stats must be re-rendered
+        self._bump_all()
+
+    def _add(self, candidate_id: int, votes: int):
+        self._counts[candidate_id] = self._counts.get(candidate_id, 0) + votes
+        self.version += 1
+        candidate = candidate_catalog.get(candidate_id)
+        if candidate is not None:
+            self._faculty_versions[candidate.facultet_type] = self.version
+
+    def increment(self, candidate_id: int):
+        # no await in here -> atomic with respect to other handlers
+        self._add(candidate_id, 1)
+        if self._store is not None:
+            # counted already: _sync must not add it again when it shows up in the shared counter
+            self._applied[candidate_id] = self._applied.get(candidate_id, 0) + 1
+            tasks.spawn(self._publish(candidate_id))
+
+    async def _publish(self, candidate_id: int):
+        try:
+            await self._store.incr(f"tally:{candidate_id}")
+            await self._store.incr("tally:epoch")
+        except Exception as e:
+            LOG.warning("Failed to publish vote to shared store: %s", e)
+
+    async def _read_epoch(self) -> int:
+        return int(await self._store.get("tally:epoch") or 0)
+
+    async def _read_counters(self) -> dict[int, int]:
+        counters = {}
+        for c in candidate_catalog.all():
+            counters[c.id] = int(await self._store.get(f"tally:{c.id}") or 0)
+        return counters
+
+    def faculty_version(self, fakultet_id: int) -> int:
+        return self._faculty_versions.get(fakultet_id, 0)
+
+    def count(self, candidate_id: int) -> int:
+        return self._counts.get(candidate_id, 0)
+
+    def ranking(self) -> list[tuple[int, str, int]]:
+        """(id, full_name, votes) for every candidate, most votes first."""
+        rows = [(c.id, c.full_name, self._counts.get(c.id, 0)) for c in candidate_catalog.all()]
+        rows.sort(key=lambda r: (-r[2], r[1]))
+        return rows
+
+    def faculty(self, fakultet_id: int) -> list[tuple[int, str, int]]:
+        """(id, full_name, votes) for one faculty, ordered by name."""
+        # the catalog keeps each faculty pre-sorted by name
+        return [(c.id, c.full_name, self._counts.get(c.id, 0)) for c in candidate_catalog.faculty(fakultet_id)]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._reconcile_secs)
+            try:
+                await self.load()
+            except Exception as e:
+                LOG.warning("Vote tally reconcile failed: %s", e)
+
+    async def sync(self):
+        """Add the votes other workers published since the last sync."""
+        epoch = await self._read_epoch()
+        if epoch == self._seen_epoch:
+            return
+        self._seen_epoch = epoch
+        for candidate_id, value in (await self._read_counters()).items():
+            # a value below ours is one of our own votes not published yet
+            applied = self._applied.get(candidate_id, 0)
+            if value > applied:
+                self._add(candidate_id, value - applied)
+                self._applied[candidate_id] = value
+
+    async def _sync(self):
+        while True:
+            await asyncio.sleep(self._sync_secs)
+            try:
+                await self.sync()
+            except Exception as e:
+                LOG.warning("Vote tally shared sync failed: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if self._store is not None and self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._sync())
+
+    async def stop(self):
+        for task in (self._task, self._sync_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._sync_task = None
+
+
+vote_tally = VoteTally(
+    reconcile_secs=Config.TALLY_RECONCILE_SECS,
+    store=shared_store,
+    sync_secs=Config.TALLY_SHARED_SYNC_SECS,
+)
+candidate_catalog.on_change(vote_tally.catalog_changed)
@@ -0,0 +1,40 @@
+# warm_photos.py
+# Ovoz berish boshlanishidan oldin barcha portretlarni Config.PHOTO_CACHE_CHAT_ID ga
+# bir marta yuklaydi va file_id larni saqlaydi.
+import asyncio
+import logging
+
+from aiogram import Bot
+
+from config import Config
+from models import db, CandidatePhoto
+from services.candidate_catalog import candidate_catalog
+from services.api_scheduler import ApiScheduler, bulk
+from services.db_executor import db_executor
+from services.photos import photo_store
+
+
+async def main():
+    if not Config.PHOTO_CACHE_CHAT_ID:
+        raise SystemExit("Config.PHOTO_CACHE_CHAT_ID sozlanmagan.")
+
+    with db.connection_context():
+        db.create_tables([CandidatePhoto])
+
+    bot = Bot(token=Config.BOT_TOKEN)
+    bot.session.middleware(ApiScheduler())
+    try:
+        await asyncio.gather(photo_store.load(), candidate_catalog.load())
+        candidates = candidate_catalog.all()
+        with bulk():
+            uploaded = await photo_store.warm(bot, Config.PHOTO_CACHE_CHAT_ID, candidates)
+    finally:
+        await bot.session.close()
+        db_executor.shutdown()
+
+    print(f"Yuklandi: {uploaded}, keshda: {photo_store.stats()['cached']} / {len(candidates)}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())